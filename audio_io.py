@@ -0,0 +1,162 @@
+import struct
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 16000
+BLOCK_SEC = 30.0
+
+# Containers the pipeline may store sources in (see sources.STORE_FORMAT)
+AUDIO_EXTS = (".wav", ".flac", ".opus", ".webm", ".m4a", ".ogg", ".mp3")
+# Formats soundfile decodes natively; anything else goes through ffmpeg
+SOUNDFILE_EXTS = (".wav", ".flac", ".ogg")
+
+
+def list_audio(directory: Path):
+    return sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in AUDIO_EXTS)
+
+
+def _native_ok(path: Path) -> bool:
+    if path.suffix.lower() not in SOUNDFILE_EXTS:
+        return False
+    try:
+        info = sf.info(str(path))
+    except RuntimeError:
+        return False
+    return info.samplerate == SAMPLE_RATE
+
+
+def _soundfile_blocks(path: Path, block_size: int):
+    for block in sf.blocks(str(path), blocksize=block_size, dtype="float32", always_2d=True):
+        yield block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+
+def _ffmpeg_blocks(path: Path, block_size: int):
+    cmd = [
+        "ffmpeg",
+        "-v", "error",
+        "-i", str(path),
+        "-vn",
+        "-f", "f32le",
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    nbytes = block_size * 4
+    try:
+        while True:
+            buf = proc.stdout.read(nbytes)
+            if not buf:
+                break
+            yield np.frombuffer(buf[: len(buf) // 4 * 4], dtype=np.float32)
+    finally:
+        proc.stdout.close()
+        err = proc.stderr.read()
+        proc.stderr.close()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {path.name}: {err.decode(errors='replace')}")
+
+
+def read_blocks(path: Path, block_sec: float = BLOCK_SEC):
+    """Yield float32 mono 16 kHz blocks of roughly block_sec from any stored source."""
+    path = Path(path)
+    block_size = int(block_sec * SAMPLE_RATE)
+    if _native_ok(path):
+        yield from _soundfile_blocks(path, block_size)
+    else:
+        yield from _ffmpeg_blocks(path, block_size)
+
+
+def read_audio(path: Path) -> np.ndarray:
+    blocks = list(read_blocks(path))
+    if not blocks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(blocks)
+
+
+def read_range(path: Path, start_sec: float, end_sec: float) -> np.ndarray:
+    """float32 mono 16 kHz samples between start_sec and end_sec."""
+    path = Path(path)
+    if _native_ok(path):
+        audio, _ = sf.read(
+            str(path),
+            start=round(start_sec * SAMPLE_RATE),
+            stop=round(end_sec * SAMPLE_RATE),
+            dtype="float32",
+            always_2d=True,
+        )
+        return audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+
+    cmd = [
+        "ffmpeg",
+        "-v", "error",
+        "-ss", f"{start_sec:.3f}",
+        "-t", f"{end_sec - start_sec:.3f}",
+        "-i", str(path),
+        "-vn",
+        "-f", "f32le",
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-",
+    ]
+    out = subprocess.run(cmd, capture_output=True, check=True)
+    return np.frombuffer(out.stdout, dtype=np.float32)
+
+
+def duration(path: Path) -> float:
+    """Length in seconds, read from the header where possible."""
+    path = Path(path)
+    if path.suffix.lower() in SOUNDFILE_EXTS:
+        try:
+            info = sf.info(str(path))
+            return info.frames / info.samplerate
+        except RuntimeError:
+            pass
+    out = subprocess.run(
+        [
+            "ffprobe",
+            "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            str(path),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(out.stdout.strip() or 0)
+
+
+def pcm16_memmap(path: Path):
+    """int16 memmap over a 16 kHz mono PCM16 WAV's samples, or None for anything else."""
+    path = Path(path)
+    if path.suffix.lower() != ".wav":
+        return None
+
+    with open(path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(size - 16 + (size & 1), 1)
+            elif chunk_id == b"data":
+                offset = f.tell()
+                break
+            else:
+                f.seek(size + (size & 1), 1)
+
+    # (format tag, channels, rate, byte rate, block align, bits per sample)
+    if fmt is None or fmt[0] != 1 or fmt[1] != 1 or fmt[2] != SAMPLE_RATE or fmt[5] != 16:
+        return None
+    n = min(size, path.stat().st_size - offset) // 2
+    return np.memmap(path, dtype=np.int16, mode="r", offset=offset, shape=(n,))
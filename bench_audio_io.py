@@ -0,0 +1,70 @@
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from audio_io import list_audio, read_audio, SAMPLE_RATE
+
+# ---------------- CONFIG ----------------
+SYNTH_SEC = 600  # length of the synthetic fixture when no directory is given
+FORMATS = {
+    "wav": ["-ar", "16000", "-ac", "1", "-sample_fmt", "s16"],
+    "flac": ["-ar", "16000", "-ac", "1", "-sample_fmt", "s16", "-c:a", "flac"],
+    "opus": ["-ac", "1", "-c:a", "libopus", "-b:a", "48k"],
+}
+# --------------------------------------
+
+
+def make_fixture(out_dir: Path) -> Path:
+    # Speech-ish test signal: amplitude-modulated harmonics over pink noise
+    src = out_dir / "synth_src.wav"
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=180:duration={SYNTH_SEC}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.05:duration={SYNTH_SEC}",
+        "-filter_complex", "[0]tremolo=f=4:d=0.8[v];[v][1]amix=inputs=2",
+        "-ar", "48000", "-ac", "2",
+        str(src),
+    ]
+    subprocess.run(cmd, check=True)
+    return src
+
+
+def encode(src: Path, out_dir: Path):
+    out = []
+    for ext, args in FORMATS.items():
+        dst = out_dir / f"bench.{ext}"
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", str(src), *args, str(dst)], check=True)
+        out.append(dst)
+    return out
+
+
+def bench(path: Path):
+    start = time.perf_counter()
+    audio = read_audio(path)
+    elapsed = time.perf_counter() - start
+
+    audio_sec = len(audio) / SAMPLE_RATE
+    size = path.stat().st_size
+    hours = max(audio_sec, 1e-9) / 3600
+    print(
+        f"{path.name:<28} {size / 1e6:>9.1f} MB {size / 1e6 / hours:>9.1f} MB/h "
+        f"{elapsed:>8.2f} s decode {audio_sec / max(elapsed, 1e-9):>8.0f}x realtime"
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        if len(sys.argv) > 1:
+            files = list_audio(Path(sys.argv[1]))
+        else:
+            files = encode(make_fixture(Path(tmp)), Path(tmp))
+
+        print(f"{'file':<28} {'on disk':>12} {'per hour':>12} {'decode':>15} {'speed':>17}")
+        for path in files:
+            bench(path)
+
+
+if __name__ == "__main__":
+    main()
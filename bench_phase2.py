@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+import phase2
+from audio_io import SAMPLE_RATE
+
+# ---------------- CONFIG ----------------
+N_FILES = 200
+FILE_SEC = 10.0
+# --------------------------------------
+
+
+def synth_speech(seconds: float, rng) -> np.ndarray:
+    # Voiced bursts (harmonics of a gliding f0, syllable-rate envelope) over
+    # low-frequency hum and broadband noise
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, 6))
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, 6)), 0, None) ** 2
+    hum = 0.05 * np.sin(2 * np.pi * 50 * t)
+    noise = 0.02 * rng.standard_normal(len(t))
+    audio = 0.2 * voiced * envelope + hum + noise
+    return np.concatenate([np.zeros(SAMPLE_RATE), audio]).astype(np.float32)
+
+
+def make_fixtures(out_dir: Path, n: int):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        path = out_dir / f"synth_{i:04d}.wav"
+        sf.write(path, synth_speech(FILE_SEC, rng), SAMPLE_RATE, subtype="PCM_16")
+        paths.append(path)
+    return paths
+
+
+def init_bench_worker(engine: str):
+    # Workers may re-import phase2 (spawn), so the engine is set in each one
+    phase2.ENGINE = engine
+    phase2.init_worker()
+
+
+def run_engine(engine: str, paths, out_dir: Path) -> float:
+    workers = max(1, os.cpu_count() - 1)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_bench_worker, initargs=(engine,)) as executor:
+        list(executor.map(phase2.clean_audio, paths, [out_dir / p.name for p in paths]))
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_FILES
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "in").mkdir()
+        paths = make_fixtures(tmp / "in", n)
+        audio_sec = n * (FILE_SEC + 1)
+
+        for engine in ("ffmpeg", "numpy"):
+            out_dir = tmp / engine
+            out_dir.mkdir()
+            elapsed = run_engine(engine, paths, out_dir)
+            print(
+                f"{engine:<7} {n} files in {elapsed:6.2f} s  "
+                f"{n / elapsed:7.1f} files/s  {audio_sec / elapsed:7.0f}x realtime"
+            )
+
+
+if __name__ == "__main__":
+    main()
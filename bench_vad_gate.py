@@ -0,0 +1,80 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+import phase3
+
+# ---------------- CONFIG ----------------
+N_FILES = 5
+# (kind, seconds): a podcast-like layout with a dead-air intro, a quiet
+# room-tone gap and a silent tail around the speech
+LAYOUT = [("silence", 45), ("speech", 60), ("roomtone", 90), ("speech", 60), ("silence", 45)]
+# --------------------------------------
+
+
+def synth(kind: str, seconds: float, rng) -> np.ndarray:
+    n = int(seconds * phase3.SAMPLE_RATE)
+    if kind == "silence":
+        return np.zeros(n, dtype=np.float32)
+    if kind == "roomtone":
+        return (0.001 * rng.standard_normal(n)).astype(np.float32)
+    # Voiced bursts: harmonics of a gliding f0 under a syllable-rate envelope
+    t = np.arange(n) / phase3.SAMPLE_RATE
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, 6))
+    phase = 2 * np.pi * np.cumsum(f0) / phase3.SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, 6)), 0, None) ** 2
+    return (0.2 * voiced * envelope + 0.005 * rng.standard_normal(n)).astype(np.float32)
+
+
+def make_fixtures(out_dir: Path, n: int):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        path = out_dir / f"gate_{i:03d}.wav"
+        audio = np.concatenate([synth(kind, sec, rng) for kind, sec in LAYOUT])
+        sf.write(path, audio, phase3.SAMPLE_RATE, subtype="PCM_16")
+        paths.append(path)
+    return paths
+
+
+def run(paths, gate: bool):
+    # Whole process_file path (decode, VAD, cut); segments go to the manifest only
+    phase3.PRE_GATE = gate
+    phase3._gate_windows[:] = 0
+    start = time.perf_counter()
+    rows = [r for p in paths for r in phase3.process_file(p)[0]]
+    return time.perf_counter() - start, rows, phase3._gate_windows.copy()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_FILES
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        paths = make_fixtures(tmp, n)
+        phase3.PROBS_DIR = tmp
+        phase3.REUSE_PROBS = False
+        phase3.SEGMENT_FORMAT = "manifest"
+        phase3.init_worker()
+        phase3.speech_probs([np.zeros(phase3.SAMPLE_RATE, dtype=np.float32)])  # warm-up
+
+        plain, plain_rows, _ = run(paths, gate=False)
+        gated, gated_rows, (windows, skipped) = run(paths, gate=True)
+
+    audio_sec = n * sum(sec for _, sec in LAYOUT)
+    same = [(r["start_sample"], r["end_sample"]) for r in plain_rows] == [
+        (r["start_sample"], r["end_sample"]) for r in gated_rows
+    ]
+    print(f"{n} files, {audio_sec / 60:.0f} min of audio ({phase3.VAD_ENGINE} engine)")
+    print(f"no gate:  {plain:7.2f} s  {audio_sec / plain:7.0f}x realtime  {len(plain_rows)} segments")
+    print(f"pre-gate: {gated:7.2f} s  {audio_sec / gated:7.0f}x realtime  {len(gated_rows)} segments")
+    print(f"skipped {skipped / windows:.1%} of windows, speedup {plain / gated:.2f}x, "
+          f"segments {'identical' if same else 'differ'}")
+
+
+if __name__ == "__main__":
+    main()
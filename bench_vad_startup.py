@@ -0,0 +1,67 @@
+import sys
+import time
+
+import numpy as np
+import torch
+
+import phase3
+
+# ---------------- CONFIG ----------------
+N_FILES = 20
+FILE_SEC = 10.0
+# --------------------------------------
+
+
+def fake_files(n: int):
+    rng = np.random.default_rng(0)
+    return [
+        (0.1 * rng.standard_normal(int(FILE_SEC * phase3.SAMPLE_RATE))).astype(np.float32)
+        for _ in range(n)
+    ]
+
+
+def hub_load():
+    # What phase3 did before the local copy: a GitHub torch.hub load, which
+    # checks the remote repo on every call even with a warm hub cache
+    model, utils = torch.hub.load(
+        repo_or_dir="snakers4/silero-vad",
+        model="silero_vad",
+        trust_repo=True,
+    )
+    return model, utils[0]
+
+
+def per_file_load(files) -> float:
+    # Old behaviour: a hub load inside every process_file call (needs network)
+    start = time.perf_counter()
+    for audio in files:
+        phase3._vad = hub_load()
+        phase3.speech_probs([audio])
+    return time.perf_counter() - start
+
+
+def per_worker_load(files) -> float:
+    start = time.perf_counter()
+    phase3.init_worker()
+    for audio in files:
+        phase3.speech_probs([audio])
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_FILES
+    files = fake_files(n)
+
+    hub_load()            # fill the hub cache so only per-call overhead is timed
+    phase3.init_worker()  # warm the OS page cache before timing either path
+    before = per_file_load(files)
+    after = per_worker_load(files)
+
+    print(f"{n} files of {FILE_SEC:.0f} s")
+    print(f"load per file:   {before:7.2f} s total, {before / n * 1000:7.1f} ms/file")
+    print(f"load per worker: {after:7.2f} s total, {after / n * 1000:7.1f} ms/file")
+    print(f"overhead removed: {(before - after) / n * 1000:.1f} ms/file")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Append-only row CSVs with a done log, for phases that write results as jobs
+# finish. Rows are fsynced before the IDs that produced them are logged (one
+# "<id>\t<fingerprint>" line each, the fingerprint saying what input the rows
+# came from), and each batch of IDs ends with "@ <size> ..." recording every
+# output's size, so a restart truncates the outputs to the last checkpoint
+# and redoes the rest.
+import csv
+import os
+from pathlib import Path
+
+
+def load_done(path: Path):
+    """({ID logged done: fingerprint}, output sizes in bytes at the last checkpoint); ({}, None) without a log."""
+    path = Path(path)
+    if not path.exists():
+        return {}, None
+    done, ids, sizes = {}, [], None
+    # Anything after the last newline is a line torn by a crash mid-write
+    *lines, _ = path.read_text().split("\n")
+    for line in lines:
+        # IDs only count once the checkpoint line after them made it to disk
+        if line.startswith("@ "):
+            done.update(ids)
+            ids, sizes = [], [int(x) for x in line.split()[1:]]
+        else:
+            # Logs written before fingerprints were kept have none, so never match
+            seg_id, _, fingerprint = line.partition("\t")
+            ids.append((seg_id, fingerprint))
+    return done, sizes
+
+
+def open_rows(path: Path, fields, size, keep=None):
+    """Open a row CSV for appending from its last checkpointed size (None: start fresh)."""
+    path = Path(path)
+    if size is None or not path.exists():
+        with open(path, "w", newline="") as f:
+            csv.DictWriter(f, fieldnames=fields).writeheader()
+    else:
+        # Rows written after the last checkpoint were never logged done
+        os.truncate(path, size)
+        if keep is not None:
+            with open(path, newline="") as f:
+                rows = [r for r in csv.DictReader(f) if keep(r)]
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+            tmp.replace(path)
+
+    f = open(path, "a", newline="")
+    return f, csv.DictWriter(f, fieldnames=fields)
+
+
+def checkpoint(outputs, done_log, pending):
+    """Fsync outputs, then log the pending (ID, fingerprint) pairs and the outputs' sizes; clears pending."""
+    for f in outputs:
+        f.flush()
+        os.fsync(f.fileno())
+    sizes = " ".join(str(os.fstat(f.fileno()).st_size) for f in outputs)
+    done_log.write("".join(f"{seg_id}\t{fingerprint}\n" for seg_id, fingerprint in pending) + f"@ {sizes}\n")
+    done_log.flush()
+    os.fsync(done_log.fileno())
+    pending.clear()
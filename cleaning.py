@@ -0,0 +1,204 @@
+# In-process equivalent of phase2.FILTER_CHAIN (numpy/scipy), so cleaning a
+# short file doesn't cost an ffmpeg process launch and a decode/encode trip.
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+from scipy import signal
+
+from audio_io import SAMPLE_RATE, read_audio
+
+# ---------------- CONFIG ----------------
+TARGET_LUFS = -16.0
+TRUE_PEAK_DB = -1.5
+SILENCE_THRESHOLD_DB = -40.0
+SILENCE_KEEP_SEC = 0.8
+HIGHPASS_HZ = 120
+LOWPASS_HZ = 7500
+NOISE_PERCENTILE = 10     # per-bin noise floor estimate (stands in for afftdn nf)
+NOISE_REDUCTION_DB = 12.0  # afftdn default nr
+
+# Filtering, loudness and the spectral gate run over BLOCK_SEC blocks in
+# float32, so memory stays a few blocks above the audio itself. The noise
+# floor is estimated once per file from at most NOISE_FRAMES STFT frames
+# spread evenly over it.
+BLOCK_SEC = 30.0
+NOISE_FRAMES = 20000
+STFT_SIZE = 512
+STFT_HOP = 128
+# --------------------------------------
+
+
+def _biquad(b0, b1, b2, a0, a1, a2):
+    return np.array([[b0 / a0, b1 / a0, b2 / a0, 1.0, a1 / a0, a2 / a0]])
+
+
+@lru_cache(maxsize=None)
+def k_weighting(sr: int):
+    # ITU-R BS.1770 pre-filter (high shelf) + RLB high-pass, via RBJ biquads
+    w = 2 * np.pi * 1681.974450955533 / sr
+    gain = 10 ** (3.999843853973347 / 40)
+    alpha = np.sin(w) / (2 * 0.7071752369554196)
+    cos = np.cos(w)
+    shelf = _biquad(
+        gain * ((gain + 1) + (gain - 1) * cos + 2 * np.sqrt(gain) * alpha),
+        -2 * gain * ((gain - 1) + (gain + 1) * cos),
+        gain * ((gain + 1) + (gain - 1) * cos - 2 * np.sqrt(gain) * alpha),
+        (gain + 1) - (gain - 1) * cos + 2 * np.sqrt(gain) * alpha,
+        2 * ((gain - 1) - (gain + 1) * cos),
+        (gain + 1) - (gain - 1) * cos - 2 * np.sqrt(gain) * alpha,
+    )
+
+    w = 2 * np.pi * 38.13547087602444 / sr
+    alpha = np.sin(w) / (2 * 0.5003270373238773)
+    cos = np.cos(w)
+    highpass = _biquad(
+        (1 + cos) / 2, -(1 + cos), (1 + cos) / 2,
+        1 + alpha, -2 * cos, 1 - alpha,
+    )
+    return np.vstack([shelf, highpass]).astype(np.float32)
+
+
+@lru_cache(maxsize=None)
+def band_filters(sr: int):
+    hp = signal.butter(2, HIGHPASS_HZ, btype="highpass", fs=sr, output="sos")
+    lp = signal.butter(2, min(LOWPASS_HZ, sr / 2 * 0.99), btype="lowpass", fs=sr, output="sos")
+    return np.vstack([hp, lp]).astype(np.float32)
+
+
+def block_size(sr: int) -> int:
+    # Whole STFT hops, so block boundaries sit on the frame grid
+    return int(BLOCK_SEC * sr) // STFT_HOP * STFT_HOP
+
+
+def blockwise_sosfilt(sos: np.ndarray, audio: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """sosfilt over float32 blocks, carrying the filter state across them."""
+    out = np.empty(len(audio), dtype=np.float32)
+    zi = np.zeros((len(sos), 2), dtype=np.float32)
+    step = block_size(sr)
+    for a in range(0, len(audio), step):
+        out[a: a + step], zi = signal.sosfilt(sos, audio[a: a + step], zi=zi)
+    return out
+
+
+def hop_energies(audio: np.ndarray, sr: int = SAMPLE_RATE, skip: int = 0) -> np.ndarray:
+    """K-weighted energy of each whole 100 ms hop after the first skip samples.
+
+    The skipped samples only settle the filters. Hops of consecutive pieces
+    concatenate into the hops of the whole signal when each piece starts on
+    the 100 ms grid.
+    """
+    weighted = blockwise_sosfilt(k_weighting(sr), audio, sr)[skip:]
+    hop = int(0.1 * sr)
+    hops = len(weighted) // hop
+    return np.square(weighted[: hops * hop].reshape(hops, hop), dtype=np.float64).sum(axis=1)
+
+
+def loudness_from_hops(energy: np.ndarray, sr: int = SAMPLE_RATE) -> float:
+    """Gated integrated loudness (LUFS) from hop_energies."""
+    block = int(0.4 * sr)
+    if len(energy) < 4:
+        return -70.0
+
+    # mean square per 400 ms block with 75% overlap: sums of four 100 ms hops
+    csum = np.concatenate([[0.0], np.cumsum(energy)])
+    power = (csum[4:] - csum[:-4]) / block
+    lufs = -0.691 + 10 * np.log10(np.maximum(power, 1e-12))
+
+    power = power[lufs > -70.0]
+    if not len(power):
+        return -70.0
+    relative = -0.691 + 10 * np.log10(power.mean()) - 10.0
+    gated = power[-0.691 + 10 * np.log10(power) > relative]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def integrated_loudness(audio: np.ndarray, sr: int = SAMPLE_RATE) -> float:
+    """Gated integrated loudness (LUFS) of a mono signal, per BS.1770."""
+    return loudness_from_hops(hop_energies(audio, sr), sr)
+
+
+def normalize_gain_db(audio: np.ndarray, measured_lufs: float) -> float:
+    # Linear gain towards TARGET_LUFS, capped so sample peaks stay under TRUE_PEAK_DB
+    peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    peak_db = 20 * np.log10(peak) if peak > 0 else -120.0
+    return min(TARGET_LUFS - measured_lufs, TRUE_PEAK_DB - peak_db)
+
+
+def trim_leading_silence(audio: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    loud = np.flatnonzero(np.abs(audio) > 10 ** (SILENCE_THRESHOLD_DB / 20))
+    if not len(loud):
+        return audio[:0]
+    return audio[max(0, loud[0] - int(SILENCE_KEEP_SEC * sr)):]
+
+
+def _stft(audio: np.ndarray, sr: int):
+    return signal.stft(audio, fs=sr, nperseg=STFT_SIZE, noverlap=STFT_SIZE - STFT_HOP)[2]
+
+
+def noise_floor(audio: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Per-bin NOISE_PERCENTILE magnitude over an even sample of the file's STFT frames."""
+    stride = max(1, -(-len(audio) // STFT_HOP) // NOISE_FRAMES)
+    step = block_size(sr)
+    # A tail shorter than one frame would change the STFT size; it adds nothing to the estimate
+    frames = [
+        np.abs(_stft(audio[a: a + step], sr))[:, ::stride]
+        for a in range(0, len(audio), step)
+        if len(audio) - a >= STFT_SIZE
+    ]
+    return np.percentile(np.concatenate(frames, axis=1), NOISE_PERCENTILE, axis=1, keepdims=True).astype(np.float32)
+
+
+def spectral_gate(audio: np.ndarray, noise: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Gate each block against the noise floor.
+
+    Blocks are transformed with STFT_SIZE samples of context on each side and
+    start on the frame grid, so every kept sample sees the same frames as a
+    whole-file STFT would.
+    """
+    floor = np.float32(10 ** (-NOISE_REDUCTION_DB / 20))
+    out = np.empty(len(audio), dtype=np.float32)
+    step = block_size(sr)
+    for a in range(0, len(audio), step):
+        b = min(a + step, len(audio))
+        lo, hi = max(0, a - STFT_SIZE), min(len(audio), b + STFT_SIZE)
+        spec = _stft(audio[lo:hi], sr)
+        gain = np.clip(1 - noise / np.maximum(np.abs(spec), 1e-12), floor, 1.0)
+        _, gated = signal.istft(spec * gain, fs=sr, nperseg=STFT_SIZE, noverlap=STFT_SIZE - STFT_HOP)
+        out[a:b] = gated[a - lo: b - lo]
+    return out
+
+
+def spectral_denoise(audio: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    # Stationary spectral gate: per-bin noise floor from the quietest frames,
+    # attenuation limited to NOISE_REDUCTION_DB like afftdn's nr
+    if len(audio) < STFT_SIZE:
+        return audio
+    return spectral_gate(audio, noise_floor(audio, sr), sr)
+
+
+def clean_array(
+    audio: np.ndarray,
+    sr: int = SAMPLE_RATE,
+    gain_db: float = None,
+    trim: bool = True,
+) -> np.ndarray:
+    # Nothing to filter: empty input, or input that was all below the trim threshold
+    if not len(audio):
+        return audio.astype(np.float32)
+    if gain_db is None:
+        gain_db = normalize_gain_db(audio, integrated_loudness(audio, sr))
+    audio = audio.astype(np.float32) * np.float32(10 ** (gain_db / 20))
+    if trim:
+        audio = trim_leading_silence(audio, sr)
+        if not len(audio):
+            return audio.astype(np.float32)
+    audio = blockwise_sosfilt(band_filters(sr), audio, sr)
+    audio = spectral_denoise(audio, sr)
+    return np.clip(audio, -1.0, 1.0, out=audio)
+
+
+def clean_file(in_path: Path, out_path: Path, gain_db: float = None):
+    audio = read_audio(in_path)
+    sf.write(str(out_path), clean_array(audio, SAMPLE_RATE, gain_db), SAMPLE_RATE, subtype="PCM_16")
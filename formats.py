@@ -0,0 +1,71 @@
+# Audio format selection for 16 kHz mono ASR targets. Everything is
+# downsampled in Phase 1 anyway, so the smallest audio-only stream that
+# still clears a per-codec quality floor is as good as "bestaudio".
+
+# ---------------- CONFIG ----------------
+MIN_ASR = 16000          # never go below the Phase 1 sample rate
+MIN_ABR = {              # kbps floor per codec family
+    "opus": 32,
+    "mp4a": 48,
+    "vorbis": 48,
+}
+DEFAULT_MIN_ABR = 64     # mp3 and anything unrecognised
+# --------------------------------------
+
+
+def is_audio_only(f) -> bool:
+    return f.get("acodec") not in (None, "none") and f.get("vcodec") in (None, "none")
+
+
+def min_abr(f) -> float:
+    acodec = (f.get("acodec") or "").split(".")[0]
+    return MIN_ABR.get(acodec, DEFAULT_MIN_ABR)
+
+
+def estimated_size(f, duration: float) -> float:
+    size = f.get("filesize") or f.get("filesize_approx")
+    if size:
+        return float(size)
+    return (f.get("abr") or f.get("tbr") or 0) * 1000 / 8 * (duration or 0)
+
+
+def best_audio(formats):
+    """Roughly what "bestaudio" resolves to: the highest-bitrate audio-only stream."""
+    audio = [f for f in formats if is_audio_only(f)]
+    return max(audio, key=lambda f: f.get("abr") or 0) if audio else None
+
+
+def smallest_audio(formats, duration: float = 0):
+    audio = [f for f in formats if is_audio_only(f)]
+    eligible = [
+        f for f in audio
+        if (f.get("abr") or 0) >= min_abr(f) and (f.get("asr") or MIN_ASR) >= MIN_ASR
+    ]
+    if not eligible:
+        return best_audio(formats)
+    # Without a duration, bitrate is the size proxy
+    if duration:
+        return min(eligible, key=lambda f: estimated_size(f, duration))
+    return min(eligible, key=lambda f: f.get("abr") or 0)
+
+
+def asr_format_selector(ctx):
+    # yt_dlp "format" callback; falls back to the best muxed stream if a
+    # site offers no audio-only formats at all, and selects nothing (yt_dlp
+    # reports "requested format is not available") if it offers no formats
+    formats = ctx["formats"]
+    chosen = smallest_audio(formats)
+    if chosen is None and formats:
+        chosen = formats[-1]
+    if chosen is not None:
+        yield chosen
+
+
+def bytes_saved(info) -> float:
+    formats = info.get("formats") or []
+    duration = info.get("duration") or 0
+    best = best_audio(formats)
+    chosen = next((f for f in formats if f.get("format_id") == info.get("format_id")), None)
+    if best is None or chosen is None:
+        return 0.0
+    return max(0.0, estimated_size(best, duration) - estimated_size(chosen, duration))
@@ -1,72 +1,308 @@
 import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import yt_dlp
 
-OUTPUT_DIR = "audio_small"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-YOUTUBE_URLS = [
-    # "https://www.youtube.com/watch?v=wQUkAHs_-1M",
-    # "https://www.youtube.com/watch?v=7aL7tKGvoyE",
-    # "https://www.youtube.com/watch?v=rqgFNBX8KMg",
-    # "https://www.youtube.com/watch?v=6KTz9aR4HnE",
-    # "https://www.youtube.com/watch?v=m5AdVEW31KY",
-    # "https://www.youtube.com/watch?v=hRbRBes4YAY",
-    # "https://www.youtube.com/watch?v=xD4n_RSWjwo",
-    # "https://www.youtube.com/watch?v=2UUeAIjmU7w",
-    # "https://www.youtube.com/watch?v=_E28SKoAyIc",
-    # "https://www.youtube.com/watch?v=pvYRilq_M2w",
-    # "http://youtube.com/watch?v=E6DwHnQubag",
-    # "https://www.youtube.com/watch?v=kyZE2AABkHo",
-    # "https://www.youtube.com/shorts/2s-B7ZW0XJM",
-    # "https://www.youtube.com/watch?v=wQUkAHs_-1M",
-    # "https://www.youtube.com/watch?v=HfnjIJTnxsg",
-    # "https://www.youtube.com/watch?v=H8ly868IocE",
-    # "https://www.youtube.com/watch?v=sM4jakkRz2Q",
-    # "https://www.youtube.com/watch?v=XkU_KxSV9Os",
-    # "https://www.youtube.com/watch?v=BMqTMmkJjmI",
-    # "https://www.youtube.com/watch?v=t5pmKbzR1r4",
-    # "https://www.youtube.com/watch?v=M0UWfpAknWM",
-    # "https://www.youtube.com/watch?v=Q5hCVCPMiQs",
-    # "https://www.youtube.com/watch?v=dGlXDdBaSDc"
-    # "https://www.youtube.com/watch?v=IwWPUL8MHi8",
-    # "https://www.youtube.com/watch?v=I87GGs55pgU",
-    # "https://www.youtube.com/watch?v=kLCUkQ3kHDk",
-    # "https://www.youtube.com/watch?v=fFIfQJb9s-0",
-    # "https://www.youtube.com/watch?v=yzvOJAvQPUk",
-    # "https://www.youtube.com/watch?v=gbC66B8BBuc",
-    # "https://www.youtube.com/watch?v=GAj-fv-NF_Q&",
-    # "https://www.youtube.com/watch?v=cQyigImufIo",
-    # "https://www.youtube.com/watch?v=2aQJ8NZFc1Q", 
-    # "https://www.youtube.com/watch?v=fYUMmsfK-Ok",
-    # "https://www.youtube.com/watch?v=faFx_3qoaVM",
-    # "https://www.youtube.com/watch?v=oXbalSJZyVs"
-    # "https://www.youtube.com/watch?v=1C-oG5_3w2w",
-    # "https://www.youtube.com/watch?v=odhSsbd1ee4",
-    # "https://www.youtube.com/watch?v=uzd5j-8w8hw",
-    # "https://www.youtube.com/watch?v=QJd1sYMTMHE"
-
-    "https://www.youtube.com/watch?v=sMY-v0ZlmGA"
-]
+import phase2
+import throughput
+from formats import asr_format_selector, bytes_saved
+from manifest import DONE, DOWNLOADED, FAILED, Manifest, dedupe_urls, file_sha256
+from sources import (
+    DOWNLOAD_WORKERS, FORMAT_SELECTION, INGEST_MODE, MANIFEST_PATH, STORE_FORMAT, YOUTUBE_URLS,
+    requested_sections,
+)
+
+# ---------------- CONFIG ----------------
+OUTPUT_DIR = Path("audio_small")
+RAW_DIR = Path("audio_raw")      # native downloads, removed after extraction
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+RAW_DIR.mkdir(parents=True, exist_ok=True)
+
+EXTRACT_WORKERS = max(1, os.cpu_count() - 1)  # concurrent ffmpeg extractions
+MAX_PER_HOST = 3                 # concurrent fetches against a single host
+# Download list, format, storage and section settings live in sources.py
+# ---------------------------------------
+
 
+# Any URL yt_dlp understands works here, including plain media files served
+# locally (python -m http.server) through the generic extractor, which is
+# handy for exercising the scheduler without touching YouTube.
 ydl_opts = {
-    "format": "bestaudio/best",
-    "outtmpl": os.path.join(OUTPUT_DIR, "%(id)s.%(ext)s"),  # SAFE filenames
-    "postprocessors": [
-        {
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": "wav",
-        }
-    ],
-    "postprocessor_args": [
-        "-ar", "16000",        # Phase 1: sample rate
-        "-ac", "1",            # Phase 1: mono
-        "-sample_fmt", "s16",  # Phase 1: 16-bit PCM
-    ],
+    "format": asr_format_selector if FORMAT_SELECTION == "asr" else "bestaudio/best",
+    "outtmpl": str(RAW_DIR / "%(id)s%(section_start&_s{:.0f})s.%(ext)s"),  # SAFE filenames
+    "download_ranges": requested_sections,
     "prefer_ffmpeg": True,
     "quiet": False,
+    "noprogress": True,  # parallel progress bars just interleave
 }
 
-with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-    ydl.download(YOUTUBE_URLS)
 
-print("Download + Phase 1 standardization complete.")
+def host_of(url: str) -> str:
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class HostLimiter:
+    """Per-host semaphores so one host never gets more than MAX_PER_HOST fetches."""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def slot(self, url: str):
+        host = host_of(url)
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._slots[host]
+
+
+def join_sections(paths, video_id: str) -> Path:
+    # Sections share one codec, so a stream copy concat is enough
+    if len(paths) == 1:
+        return paths[0]
+
+    out_path = RAW_DIR / f"{video_id}{paths[0].suffix}"
+    list_path = RAW_DIR / f"{video_id}.sections.txt"
+    list_path.write_text("".join(f"file '{p.resolve()}'\n" for p in paths))
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", str(list_path),
+        "-c", "copy",
+        str(out_path),
+    ]
+    subprocess.run(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True
+    )
+    for p in paths:
+        p.unlink(missing_ok=True)
+    list_path.unlink(missing_ok=True)
+    return out_path
+
+
+def fetch(key: str, url: str, limiter: HostLimiter):
+    stats = {"key": key, "url": url, "bytes": 0, "duration": 0.0, "ok": False}
+
+    def hook(d):
+        if d["status"] == "finished":
+            stats["bytes"] += d.get("downloaded_bytes") or d.get("total_bytes") or 0
+
+    opts = dict(ydl_opts, progress_hooks=[hook])
+    start = time.monotonic()
+
+    with limiter.slot(url):
+        try:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                info = ydl.extract_info(url, download=True)
+                downloads = info.get("requested_downloads") or [{}]
+                paths = [Path(d.get("filepath") or ydl.prepare_filename(info)) for d in downloads]
+            path = join_sections(paths, info["id"])
+        except (yt_dlp.utils.DownloadError, subprocess.CalledProcessError) as e:
+            stats["error"] = str(e)
+            stats["fetch_sec"] = time.monotonic() - start
+            return stats
+
+    sections = [d for d in downloads if "section_start" in d]
+    if sections:
+        duration = sum(d["section_end"] - d["section_start"] for d in sections)
+    else:
+        duration = info.get("duration") or 0
+
+    saved = bytes_saved(info)
+    print(f"{info['id']}: format {info.get('format_id')} ({info.get('acodec')}, "
+          f"{info.get('abr') or 0:.0f} kbps), {saved / 1e6:.1f} MB saved vs bestaudio")
+
+    stats.update(
+        ok=True,
+        id=info["id"],
+        raw_path=path,
+        format_id=info.get("format_id"),
+        saved=saved,
+        duration=float(duration),
+        sections=[(d["section_start"], d["section_end"]) for d in sections],
+        fetch_sec=time.monotonic() - start,
+    )
+    return stats
+
+
+def extract_audio(src: Path, dst: Path):
+    # Phase 1 standardization: 16 kHz mono s16, container picked from dst suffix
+    tmp = dst.with_name(dst.stem + ".part" + dst.suffix)
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i", str(src),
+        "-vn",
+        "-ar", "16000",        # Phase 1: sample rate
+        "-ac", "1",            # Phase 1: mono
+        "-sample_fmt", "s16",  # Phase 1: 16-bit PCM
+        str(tmp),
+    ]
+    subprocess.run(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True
+    )
+    os.replace(tmp, dst)
+
+
+def finalize(stats, manifest: Manifest):
+    start = time.monotonic()
+    raw_path = stats["raw_path"]
+
+    try:
+        if INGEST_MODE == "fused":
+            out_path = phase2.OUT_DIR / f"{stats['id']}{phase2.OUT_EXT}"
+            phase2.clean_audio(raw_path, out_path)
+        elif STORE_FORMAT == "native":
+            out_path = OUTPUT_DIR / f"{stats['id']}{raw_path.suffix}"
+            os.replace(raw_path, out_path)
+        else:
+            out_path = OUTPUT_DIR / f"{stats['id']}.{STORE_FORMAT}"
+            extract_audio(raw_path, out_path)
+    except subprocess.CalledProcessError as e:
+        stats.update(ok=False, error=f"ffmpeg exited with {e.returncode}")
+        manifest.update(stats["key"], status=FAILED, error=stats["error"])
+    except Exception as e:  # numpy engine: soundfile / RuntimeError
+        stats.update(ok=False, error=f"{type(e).__name__}: {e}")
+        manifest.update(stats["key"], status=FAILED, error=stats["error"])
+    else:
+        stats["out_path"] = out_path
+        raw_path.unlink(missing_ok=True)
+        manifest.update(
+            stats["key"],
+            status=DONE,
+            out_path=out_path,
+            sha256=file_sha256(out_path),
+            error=None,
+        )
+
+    stats["extract_sec"] = time.monotonic() - start
+    return stats
+
+
+def record_fetch(stats, manifest: Manifest):
+    if stats["ok"]:
+        manifest.update(
+            stats["key"],
+            url=stats["url"],
+            id=stats["id"],
+            status=DOWNLOADED,
+            raw_path=stats["raw_path"],
+            duration=stats["duration"],
+            sections=stats["sections"],
+            format_id=stats["format_id"],
+            bytes=stats["bytes"],
+        )
+    else:
+        manifest.update(stats["key"], url=stats["url"], status=FAILED, error=stats["error"])
+
+
+def resumable(key: str, manifest: Manifest):
+    """Stats for an entry whose raw download finished but was never extracted."""
+    entry = manifest.get(key)
+    if entry.get("status") == DOWNLOADED and Path(entry["raw_path"]).exists():
+        return {
+            "key": key,
+            "url": entry["url"],
+            "id": entry["id"],
+            "raw_path": Path(entry["raw_path"]),
+            "duration": entry.get("duration", 0.0),
+            "bytes": 0,  # nothing fetched this run
+            "ok": True,
+        }
+    return None
+
+
+def summarize(results, wall_sec):
+    ok = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+
+    total_bytes = sum(r["bytes"] for r in ok)
+    audio_sec = sum(r["duration"] for r in ok)
+    saved = sum(r.get("saved", 0) for r in ok)
+    fetch_sec = sum(r.get("fetch_sec", 0) for r in ok)
+    extract_sec = sum(r.get("extract_sec", 0) for r in ok)
+
+    print("\n---------------- THROUGHPUT ----------------")
+    print(f"videos:     {len(ok)} ok, {len(failed)} failed")
+    print(f"downloaded: {total_bytes / 1e6:.1f} MB in {wall_sec:.1f} s wall "
+          f"({total_bytes / 1e6 / max(wall_sec, 1e-9):.2f} MB/s)")
+    print(f"saved:      {saved / 1e6:.1f} MB vs bestaudio")
+    print(f"audio:      {audio_sec / 3600:.2f} h "
+          f"({audio_sec / max(wall_sec, 1e-9):.1f}x realtime)")
+    print(f"busy time:  fetch {fetch_sec:.1f} s, extract {extract_sec:.1f} s "
+          f"(overlap saved {max(0.0, fetch_sec + extract_sec - wall_sec):.1f} s)")
+    for r in failed:
+        print(f"FAILED {r['url']}: {r.get('error', 'unknown error')}")
+    print("--------------------------------------------")
+
+    if ok:
+        throughput.record("download", audio_sec, wall_sec, total_bytes)
+
+
+def download(urls):
+    manifest = Manifest(MANIFEST_PATH)
+    limiter = HostLimiter(MAX_PER_HOST)
+    results = []
+    start = time.monotonic()
+
+    # Canonical IDs collapse shorts/, http vs https and stray "&" duplicates
+    pending = [(key, url) for key, url in dedupe_urls(urls) if not manifest.is_done(key)]
+    skipped = len(urls) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} URLs already in {MANIFEST_PATH} or duplicated.")
+
+    resumed = [resumable(key, manifest) for key, _ in pending]
+    to_extract = [r for r in resumed if r]
+    to_fetch = [(key, url) for (key, url), r in zip(pending, resumed) if not r]
+
+    # Fetches and extractions run in separate pools, so the network keeps
+    # working while ffmpeg converts whatever already landed on disk.
+    with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as extract_pool:
+        extractions = [extract_pool.submit(finalize, r, manifest) for r in to_extract]
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as fetch_pool:
+            fetches = [fetch_pool.submit(fetch, key, url, limiter) for key, url in to_fetch]
+            for f in as_completed(fetches):
+                stats = f.result()
+                record_fetch(stats, manifest)
+                if stats["ok"]:
+                    extractions.append(extract_pool.submit(finalize, stats, manifest))
+                else:
+                    results.append(stats)
+
+        for f in as_completed(extractions):
+            results.append(f.result())
+
+    summarize(results, time.monotonic() - start)
+    return results
+
+
+def main():
+    assert shutil.which("ffmpeg"), "ffmpeg not found on PATH"
+    assert INGEST_MODE in ("two_stage", "fused"), f"unknown INGEST_MODE {INGEST_MODE!r}"
+    assert STORE_FORMAT in ("wav", "flac", "native"), f"unknown STORE_FORMAT {STORE_FORMAT!r}"
+    download(YOUTUBE_URLS)
+
+    if INGEST_MODE == "fused":
+        print(f"Download + Phase 1/2 fused ingest complete ({phase2.OUT_DIR}/).")
+    else:
+        print("Download + Phase 1 standardization complete.")
+
+
+if __name__ == "__main__":
+    main()
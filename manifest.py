@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse, urlunparse
+
+YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "youtu.be"}
+VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+# status values: "downloaded" (raw file on disk, not yet extracted),
+# "done" (final artifact written), "failed"
+DONE = "done"
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+
+
+def youtube_id(url: str):
+    parsed = urlparse(url.strip().rstrip("&?"))
+    host = parsed.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host not in YOUTUBE_HOSTS:
+        return None
+
+    if host == "youtu.be":
+        candidate = parsed.path.strip("/").split("/")[0]
+    elif parsed.path.startswith(("/shorts/", "/embed/", "/live/", "/v/")):
+        candidate = parsed.path.split("/")[2]
+    else:
+        candidate = parse_qs(parsed.query).get("v", [""])[0]
+
+    return candidate if VIDEO_ID.match(candidate) else None
+
+
+def normalize_url(url: str):
+    """Return (key, url): the canonical video ID and the URL to fetch it from."""
+    vid = youtube_id(url)
+    if vid:
+        return vid, f"https://www.youtube.com/watch?v={vid}"
+
+    # Non-YouTube URLs (e.g. a local media server) are keyed by the cleaned URL
+    parsed = urlparse(url.strip().rstrip("&?"))
+    cleaned = urlunparse(parsed._replace(netloc=parsed.netloc.lower(), fragment=""))
+    return cleaned, cleaned
+
+
+def dedupe_urls(urls):
+    seen = {}
+    for url in urls:
+        key, canonical = normalize_url(url)
+        seen.setdefault(key, canonical)
+    return list(seen.items())
+
+
+def file_sha256(path: Path, chunk_size=1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Manifest:
+    """JSON download manifest keyed by canonical video ID, safe to share between threads."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def get(self, key: str):
+        with self._lock:
+            return dict(self.entries.get(key, {}))
+
+    def is_done(self, key: str) -> bool:
+        entry = self.get(key)
+        return entry.get("status") == DONE and Path(entry.get("out_path", "")).exists()
+
+    def update(self, key: str, **fields):
+        with self._lock:
+            entry = self.entries.setdefault(key, {})
+            entry.update({k: str(v) if isinstance(v, Path) else v for k, v in fields.items()})
+            entry["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            self._save()
+
+    def _save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -1,33 +1,182 @@
+import json
+import math
 import subprocess
 import os
+import time
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
+import numpy as np
+import soundfile as sf
+
+import cleaning
+import throughput
+from audio_io import SAMPLE_RATE, duration, list_audio, read_audio, read_range
+from manifest import file_sha256
+from scheduling import LongestFirst, split_ranges
+
 IN_DIR = Path("audio_small")
 OUT_DIR = Path("audio_clean_p2")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+OUT_EXT = ".wav"  # ".flac" halves disk use; phase3 decodes either through audio_io
+
+# "ffmpeg": one ffmpeg process per file running FILTER_CHAIN
+# "numpy": cleaning.py's in-process equivalent, no per-file process launch
+ENGINE = "ffmpeg"
+
+# "dynamic": single-pass loudnorm (upsamples to 192 kHz internally)
+# "linear": measure integrated loudness once per file, cache it by content
+# hash, and apply a plain gain; re-cleaning never re-measures
+LOUDNORM_MODE = "dynamic"
+LOUDNESS_CACHE = Path("loudness_cache")
+LOUDNESS_CACHE.mkdir(parents=True, exist_ok=True)
+
+TARGET_I = -16.0
+TARGET_LRA = 11.0
+TARGET_TP = -1.5
+
+# Files longer than SPLIT_MIN_SEC are cleaned as ~SPLIT_SEC chunks in
+# parallel and crossfaded back together over 2 * OVERLAP_SEC. Chunks always
+# use the linear gain so loudness stays consistent across the file; on a
+# cache miss it is measured chunk by chunk in parallel too (cleaning.py's
+# BS.1770 meter, whatever the ENGINE), and the chunks' 100 ms hop energies
+# are combined into the file's integrated loudness.
+SPLIT_MIN_SEC = 1800
+SPLIT_SEC = 600
+OVERLAP_SEC = 2.0
+SPLIT_GRID_SEC = 0.1  # chunk bounds fall on whole milliseconds, samples and loudness hops
+PARTS_DIR = OUT_DIR / ".parts"
+
+LOUDNORM = f"loudnorm=I={TARGET_I:g}:LRA={TARGET_LRA:g}:TP={TARGET_TP:g}"
 
-def clean_audio(wav_path: Path):
-    out_path = OUT_DIR / wav_path.name
+# Remove long silences only
+SILENCE_FILTER = (
+    "silenceremove=start_periods=1:"
+    "start_silence=0.8:"
+    "start_threshold=-40dB"
+)
 
+DENOISE_CHAIN = (
+    # Background music + noise suppression
+    "highpass=f=120,"          # remove rumble / music bass
+    "lowpass=f=7500,"          # remove hiss
+    "afftdn=nf=-25"            # very mild denoising
+)
+
+CLEAN_CHAIN = SILENCE_FILTER + "," + DENOISE_CHAIN
+
+# Loudness normalization (speech-safe) followed by cleanup
+FILTER_CHAIN = LOUDNORM + "," + CLEAN_CHAIN
+
+
+def measure_loudness(wav_path: Path):
+    if ENGINE == "numpy":
+        audio = read_audio(wav_path)
+        peak = float(abs(audio).max()) if len(audio) else 0.0
+        return {
+            "input_i": cleaning.integrated_loudness(audio),
+            "input_tp": 20 * math.log10(peak) if peak > 0 else -120.0,
+        }
+
+    # loudnorm analysis pass; its JSON summary is the last thing on stderr
     cmd = [
         "ffmpeg",
-        "-y",
+        "-hide_banner",
         "-i", str(wav_path),
-        "-af",
-        (
-            # Loudness normalization (speech-safe)
-            "loudnorm=I=-16:LRA=11:TP=-1.5,"
-            # Remove long silences only
-            "silenceremove=start_periods=1:"
-            "start_silence=0.8:"
-            "start_threshold=-40dB,"
-            # Background music + noise suppression
-            "highpass=f=120,"          # remove rumble / music bass
-            "lowpass=f=7500,"          # remove hiss
-            "afftdn=nf=-25"            # very mild denoising
-        ),
+        "-vn",
+        "-af", LOUDNORM + ":print_format=json",
+        "-f", "null",
+        "-",
+    ]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    stats = json.loads(out.stderr[out.stderr.rindex("{"):])
+    return {"input_i": float(stats["input_i"]), "input_tp": float(stats["input_tp"])}
+
+
+def measure_chunk(wav_path: Path, start: float, core_start: float, core_end: float):
+    """(hop energies, peak) of one chunk's core; the audio from start settles the meter's filters."""
+    audio = read_range(wav_path, start, core_end)
+    skip = round(core_start * SAMPLE_RATE) - round(start * SAMPLE_RATE)
+    return cleaning.hop_energies(audio, SAMPLE_RATE, skip), float(np.abs(audio[skip:]).max(initial=0.0))
+
+
+def combine_measurements(parts):
+    """Loudness measurement of a whole file from measure_chunk results in file order."""
+    peak = max(p for _, p in parts)
+    return {
+        "input_i": cleaning.loudness_from_hops(np.concatenate([e for e, _ in parts])),
+        "input_tp": 20 * math.log10(peak) if peak > 0 else -120.0,
+    }
+
+
+def save_measured(digest: str, measured):
+    cache_path = LOUDNESS_CACHE / f"{digest}.json"
+    tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(measured, f)
+    os.replace(tmp, cache_path)
+
+
+def gain_from(measured) -> float:
+    if not math.isfinite(measured["input_i"]):
+        return 0.0  # digital silence
+    return min(TARGET_I - measured["input_i"], TARGET_TP - measured["input_tp"])
+
+
+def cached_gain_db(wav_path: Path):
+    """(content hash, cached linear gain or None)."""
+    digest = file_sha256(wav_path)
+    cache_path = LOUDNESS_CACHE / f"{digest}.json"
+    if not cache_path.exists():
+        return digest, None
+    with open(cache_path) as f:
+        return digest, gain_from(json.load(f))
+
+
+def linear_gain_db(wav_path: Path) -> float:
+    digest, gain = cached_gain_db(wav_path)
+    if gain is None:
+        measured = measure_loudness(wav_path)
+        save_measured(digest, measured)
+        gain = gain_from(measured)
+    return gain
+
+
+def clean_audio(wav_path: Path, out_path: Path = None):
+    # Input can be any format ffmpeg decodes; main.py's fused ingest passes
+    # the native download here so resampling and cleaning happen in one pass.
+    out_path = out_path or OUT_DIR / (wav_path.stem + OUT_EXT)
+
+    gain_db = linear_gain_db(wav_path) if LOUDNORM_MODE == "linear" else None
+
+    if ENGINE == "numpy":
+        cleaning.clean_file(wav_path, out_path, gain_db)
+        return
+
+    if gain_db is None:
+        filters = FILTER_CHAIN
+    else:
+        filters = f"volume={gain_db:.2f}dB," + CLEAN_CHAIN
+
+    run_ffmpeg(wav_path, out_path, filters)
+
+
+def run_ffmpeg(in_path: Path, out_path: Path, filters: str, start: float = None, end: float = None):
+    seek = []
+    if start is not None:
+        # Decode a little past the end and cut at an exact sample count, so
+        # chunk overlaps line up sample for sample when stitching
+        seek = ["-ss", f"{start:.3f}", "-t", f"{end - start + 1:.3f}"]
+        n = round((end - start) * SAMPLE_RATE)
+        filters = f"aresample={SAMPLE_RATE},atrim=end_sample={n}," + filters
+    cmd = [
+        "ffmpeg",
+        "-y",
+        *seek,
+        "-i", str(in_path),
+        "-vn",
+        "-af", filters,
         "-ar", "16000",
         "-ac", "1",
         "-sample_fmt", "s16",
@@ -41,16 +190,108 @@ def clean_audio(wav_path: Path):
         check=True
     )
 
+
+def part_path(wav_path: Path, i: int) -> Path:
+    return PARTS_DIR / f"{wav_path.stem}.{i:03d}.wav"
+
+
+def clean_chunk(wav_path: Path, i: int, start: float, end: float, gain_db: float):
+    # Only the first chunk trims leading silence; later chunks must keep
+    # their exact length so the overlaps line up when stitching
+    out_path = part_path(wav_path, i)
+
+    if ENGINE == "numpy":
+        audio = read_range(wav_path, start, end)
+        cleaned = cleaning.clean_array(audio, SAMPLE_RATE, gain_db, trim=(i == 0))
+        sf.write(str(out_path), cleaned, SAMPLE_RATE, subtype="PCM_16")
+        return
+
+    chain = CLEAN_CHAIN if i == 0 else DENOISE_CHAIN
+    run_ffmpeg(wav_path, out_path, f"volume={gain_db:.2f}dB," + chain, start, end)
+
+
+def stitch(wav_path: Path, n_parts: int):
+    # Parts are aligned at their ends: part i's last 2*OVERLAP_SEC are the
+    # same source audio as part i+1's first 2*OVERLAP_SEC
+    fade = int(2 * OVERLAP_SEC * SAMPLE_RATE)
+    out_path = OUT_DIR / (wav_path.stem + OUT_EXT)
+    tail = np.zeros(0, dtype=np.float32)
+
+    with sf.SoundFile(str(out_path), "w", SAMPLE_RATE, 1, subtype="PCM_16") as out:
+        for i in range(n_parts):
+            audio, _ = sf.read(str(part_path(wav_path, i)), dtype="float32")
+            n = min(len(tail), len(audio))
+            if n:
+                ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+                audio[:n] = tail[-n:] * (1 - ramp) + audio[:n] * ramp
+            keep = len(audio) - fade if i < n_parts - 1 else len(audio)
+            out.write(audio[:max(keep, 0)])
+            tail = audio[max(keep, 0):]
+
+    for i in range(n_parts):
+        part_path(wav_path, i).unlink(missing_ok=True)
+
+
+def init_worker():
+    # Design the filters once per worker rather than once per file
+    cleaning.band_filters(16000)
+    cleaning.k_weighting(16000)
+
+
 def main():
-    wav_files = list(IN_DIR.glob("*.wav"))
-    assert wav_files, "No WAV files found in audio_small/"
+    # Sources may be WAV, FLAC or the native download; ffmpeg decodes them all
+    wav_files = list_audio(IN_DIR)
+    assert wav_files, "No audio files found in audio_small/"
 
     workers = max(1, os.cpu_count() - 1)
+    start = time.monotonic()
+
+    # Header-only reads; longest files start first so none is left running alone
+    durations = {w: duration(w) for w in wav_files}
+    PARTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        sched = LongestFirst(executor, workers)
+        for w, dur in durations.items():
+            if dur > SPLIT_MIN_SEC:
+                sched.push(dur, ("gain", w), cached_gain_db, w)
+            else:
+                sched.push(dur, ("file", w), clean_audio, w)
+
+        ranges, digests, measured = {}, {}, {}
+        remaining = {}
+
+        def push_chunks(w, gain_db):
+            remaining[w] = len(ranges[w])
+            for i, (s, e, _, _) in enumerate(ranges[w]):
+                sched.push(e - s, ("chunk", w), clean_chunk, w, i, s, e, gain_db)
+
+        with tqdm(total=len(wav_files)) as pbar:
+            for tag, result in sched.run():
+                kind, w = tag[:2]
+                if kind == "gain":
+                    ranges[w] = split_ranges(durations[w], SPLIT_SEC, OVERLAP_SEC, SPLIT_GRID_SEC)
+                    digests[w], gain_db = result
+                    if gain_db is not None:
+                        push_chunks(w, gain_db)
+                        continue
+                    measured[w] = {}
+                    for k, (s, _, cs, ce) in enumerate(ranges[w]):
+                        sched.push(ce - cs, ("measure", w, k), measure_chunk, w, s, cs, ce)
+                elif kind == "measure":
+                    measured[w][tag[2]] = result
+                    if len(measured[w]) == len(ranges[w]):
+                        file_measured = combine_measurements([measured[w][k] for k in range(len(ranges[w]))])
+                        save_measured(digests[w], file_measured)
+                        push_chunks(w, gain_from(file_measured))
+                elif kind == "chunk":
+                    remaining[w] -= 1
+                    if not remaining[w]:
+                        sched.push(float("inf"), ("file", w), stitch, w, len(ranges[w]))
+                else:
+                    pbar.update()
 
-    with ProcessPoolExecutor(max_workers=workers) as executor:
-        futures = [executor.submit(clean_audio, w) for w in wav_files]
-        for _ in tqdm(as_completed(futures), total=len(futures)):
-            pass
+    throughput.record("phase2", sum(durations.values()), time.monotonic() - start)
 
     print(f"Phase 2 complete: cleaned {len(wav_files)} files.")
 
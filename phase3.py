@@ -1,12 +1,24 @@
+import math
 import os
+import shutil
+import sys
+import time
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 
 import torch
 import soundfile as sf
 import numpy as np
 from tqdm import tqdm
 
+import shards
+import throughput
+import vad
+from manifest import file_sha256
+from audio_io import duration, list_audio, read_audio, read_blocks, read_range
+from scheduling import LongestFirst, split_ranges
+from segments import PREVIOUS_MANIFEST, SEGMENT_MANIFEST, load_segments, manifest_rows, source_turns, write_manifest
+
 # ---------------- CONFIG ----------------
 IN_DIR = Path("audio_clean_p2")
 OUT_DIR = Path("audio_segments_p3")
@@ -18,19 +30,122 @@ MAX_SEG_SEC = 25.0
 
 VAD_THRESHOLD = 0.5
 MERGE_GAP_SEC = 0.3
+CUT_SEARCH_SEC = 4.0  # how far a cut may move from the even split to find a pause
+
+# Pack adjacent speech runs (and the pauses between them) into segments of up
+# to PACK_TARGET_SEC, e.g. 28 with MAX_SEG_SEC = 30 for Whisper's window.
+# Runs further apart than PACK_MAX_GAP_SEC, or whose dominant speakers differ
+# in segments.SOURCE_TURNS (phase4 source mode), are never packed together.
+# None disables packing.
+PACK_TARGET_SEC = None
+PACK_MAX_GAP_SEC = 2.0
+
+# Silero VAD is loaded from a local copy of the repo at a pinned tag so
+# workers never contact GitHub. Populate it once on a connected machine with
+# `python phase3.py --fetch-vad`, then copy models/ to air-gapped boxes.
+VAD_TAG = "v5.1.2"
+VAD_REPO_DIR = Path("models/silero-vad")
+VAD_CHECKPOINT = "src/silero_vad/data/silero_vad.jit"
+# sha256 of silero_vad.jit at VAD_TAG (same file as in the silero-vad 5.1.2
+# wheel on PyPI); update together with VAD_TAG
+VAD_SHA256 = "85c48e1f0ecb604e5d2a268f3ccfb912d4f7e935acdc86af5a3fc5b0aea7b29a"
+
+# "silero": sequential, one 512-sample window per forward call
+# "batched": vad.py, many windows per call; files shorter than BATCH_FILE_SEC
+# are grouped into jobs of up to BATCH_SEC of audio sharing those calls
+VAD_ENGINE = "silero"
+BATCH_FILE_SEC = 120
+BATCH_SEC = 1200
+
+# Stream each file through VAD in STREAM_BLOCK_SEC blocks and cut segments
+# with ranged reads, so worker memory no longer grows with file length
+STREAMING = False
+STREAM_BLOCK_SEC = 30.0
+
+# Skip the neural VAD on dead air: a vectorized RMS / zero-crossing pass
+# (vad.energy_gate, thresholds in vad.py) picks candidate spans and silero only
+# runs on those. Not applied in STREAMING mode.
+PRE_GATE = False
+
+# Files longer than SPLIT_MIN_SEC run VAD as ~SPLIT_SEC windows in parallel;
+# windows overlap by OVERLAP_SEC so speech at the cut is seen in full by one side
+SPLIT_MIN_SEC = 1800
+SPLIT_SEC = 600
+OVERLAP_SEC = 5.0
+
+# Per-window speech probabilities are kept per source (float16, keyed by
+# content hash) so resegment.py can re-cut with new thresholds without VAD
+PROBS_DIR = Path("vad_probs")
+PROBS_DIR.mkdir(parents=True, exist_ok=True)
+REUSE_PROBS = True
+
+# "wav": one {base}_seg{i:03d}.wav per segment in OUT_DIR
+# "manifest": no segment files; downstream phases slice the cleaned sources
+# through segments.load_segments(SEGMENT_MANIFEST). The manifest is written
+# in every mode.
+# "shards": as "manifest", then the segments are packed in manifest order into
+# size-bounded tar/parquet shards with an index (shards.py CONFIG)
+SEGMENT_FORMAT = "wav"
+
+# "ordinal": {base}_seg{i:03d}; renumbers whenever chunking changes
+# "stable": {source sha256[:12]}_{start sample}_{end sample}; an unchanged cut
+# keeps its ID across re-segmentation, and remap_segments.py carries
+# transcripts/diarization over to the ones that did change
+SEGMENT_IDS = "ordinal"
 # ---------------------------------------
 
 
+def fetch_vad():
+    torch.hub.load(
+        repo_or_dir=f"snakers4/silero-vad:{VAD_TAG}",
+        model="silero_vad",
+        trust_repo=True
+    )
+    cached = Path(torch.hub.get_dir()) / f"snakers4_silero-vad_{VAD_TAG}"
+    shutil.copytree(cached, VAD_REPO_DIR, dirs_exist_ok=True)
+
+    digest = file_sha256(VAD_REPO_DIR / VAD_CHECKPOINT)
+    if digest != VAD_SHA256:
+        raise RuntimeError(f"Downloaded checkpoint has sha256 {digest}, expected VAD_SHA256 {VAD_SHA256}")
+    print(f"Silero VAD {VAD_TAG} stored in {VAD_REPO_DIR}/ (sha256 {digest})")
+
+
 def load_vad():
+    checkpoint = VAD_REPO_DIR / VAD_CHECKPOINT
+    if not checkpoint.exists():
+        raise RuntimeError(f"{checkpoint} missing; run `python phase3.py --fetch-vad` first")
+
+    digest = file_sha256(checkpoint)
+    if digest != VAD_SHA256:
+        raise RuntimeError(f"{checkpoint} has sha256 {digest}, expected VAD_SHA256 {VAD_SHA256}")
+
     model, utils = torch.hub.load(
-        repo_or_dir="snakers4/silero-vad",
+        repo_or_dir=str(VAD_REPO_DIR),
         model="silero_vad",
-        trust_repo=True
+        source="local",
     )
     get_speech_timestamps = utils[0]
     return model, get_speech_timestamps
 
 
+_vad = None
+
+
+def init_worker():
+    # One model per worker process, and one intra-op thread each so
+    # cpu_count() - 1 workers don't oversubscribe the cores
+    global _vad
+    torch.set_num_threads(1)
+    _vad = load_vad()
+
+
+def get_vad():
+    global _vad
+    if _vad is None:
+        _vad = load_vad()
+    return _vad
+
+
 def merge_segments(timestamps):
     merged = []
     for t in timestamps:
@@ -45,67 +160,345 @@ def merge_segments(timestamps):
     return [(s / SAMPLE_RATE, e / SAMPLE_RATE) for s, e in merged]
 
 
-def chunk_segments(segments):
+def best_cut(probs, lo: float, hi: float) -> float:
+    """Time in [lo, hi] where the speech probability is lowest."""
+    step = vad.WINDOW / SAMPLE_RATE
+    a, b = int(lo / step), int(hi / step)
+    if probs is None or b <= a or a >= len(probs):
+        return (lo + hi) / 2
+    i = a + int(np.argmin(probs[a:b]))
+    return min(max((i + 0.5) * step, lo), hi)
+
+
+def chunk_segments(segments, probs=None):
+    # Runs longer than MAX_SEG_SEC are split into the fewest near-equal
+    # chunks, so no tail is left over to discard; only runs shorter than
+    # MIN_SEG_SEC drop. Each cut is planned from the current position: it
+    # stays within [cur + MIN_SEG_SEC, cur + MAX_SEG_SEC] and leaves a
+    # remainder the remaining chunks can cover, and only inside that range
+    # may it move up to CUT_SEARCH_SEC towards the quietest point.
     chunks = []
     for s, e in segments:
+        if e - s < MIN_SEG_SEC:
+            continue
+
         cur = s
-        while cur < e:
-            nxt = min(cur + MAX_SEG_SEC, e)
-            if nxt - cur >= MIN_SEG_SEC:
-                chunks.append((cur, nxt))
-            cur = nxt
+        while e - cur > MAX_SEG_SEC:
+            left = math.ceil((e - cur) / MAX_SEG_SEC) - 1  # chunks after this one
+            ideal = cur + (e - cur) / (left + 1)
+            lo = max(cur + MIN_SEG_SEC, e - left * MAX_SEG_SEC)
+            hi = min(cur + MAX_SEG_SEC, e - left * MIN_SEG_SEC)
+            if lo > hi:
+                # MIN_SEG_SEC > MAX_SEG_SEC / 2: the length cap wins
+                lo = hi = min(cur + MAX_SEG_SEC, max(lo, ideal))
+            search_lo, search_hi = max(lo, ideal - CUT_SEARCH_SEC), min(hi, ideal + CUT_SEARCH_SEC)
+            if search_lo < search_hi:
+                cut = best_cut(probs, search_lo, search_hi)
+            else:
+                cut = min(max(ideal, lo), hi)
+            chunks.append((cur, cut))
+            cur = cut
+        chunks.append((cur, e))
     return chunks
 
 
-def process_file(wav_path: Path):
-    audio, sr = sf.read(wav_path)
+def dominant_speaker(turns, s: float, e: float):
+    overlap = {}
+    for ts, te, speaker in turns:
+        if ts < e and te > s:
+            overlap[speaker] = overlap.get(speaker, 0.0) + min(te, e) - max(ts, s)
+    return max(overlap, key=overlap.get) if overlap else None
+
+
+def pack_runs(runs, turns=None):
+    packed, last_speaker = [], None
+    for s, e in runs:
+        speaker = dominant_speaker(turns, s, e) if turns else None
+        if (
+            packed
+            and s - packed[-1][1] <= PACK_MAX_GAP_SEC
+            and e - packed[-1][0] <= PACK_TARGET_SEC
+            and speaker == last_speaker
+        ):
+            packed[-1] = (packed[-1][0], e)
+        else:
+            packed.append((s, e))
+        last_speaker = speaker
+    return packed
+
+
+def segment_plan(probs, n_samples: int, source: Path = None):
+    """(chunks in seconds, seconds of speech runs) for one source."""
+    runs = merge_segments(to_timestamps(probs, n_samples))
+    if PACK_TARGET_SEC:
+        runs = pack_runs(runs, source_turns(source) if source else None)
+    # Packed runs include the pauses they absorbed, as the chunks cut from them do
+    speech_sec = sum(e - s for s, e in runs)
+    return chunk_segments(runs, probs), speech_sec
+
+
+# Pre-gate tally for this process: [windows seen, windows skipped]
+_gate_windows = np.zeros(2, dtype=np.int64)
+
+
+def speech_probs(audios):
+    """Per-window (512 samples) speech probabilities for each audio array."""
+    model, _ = get_vad()
+    if VAD_ENGINE == "batched":
+        run = lambda pieces: vad.batched_speech_probs(model, pieces)
+    else:
+        # Same sequential window loop get_speech_timestamps runs internally
+        run = lambda pieces: [vad.stream_speech_probs(model, [p])[0] for p in pieces]
+
+    if not PRE_GATE:
+        return run(audios)
+    probs, windows, skipped = vad.gated_speech_probs(audios, run)
+    _gate_windows[:] += (windows, skipped)
+    return probs
 
-    if sr != SAMPLE_RATE:
-        raise RuntimeError(f"{wav_path.name} has sr={sr}, expected {SAMPLE_RATE}")
 
-    # mono
-    if audio.ndim == 2:
-        audio = audio.mean(axis=1)
+def counted(fn, *args):
+    # Worker-side wrapper: fn's result plus the pre-gate windows it accounted for
+    before = _gate_windows.copy()
+    return fn(*args), _gate_windows - before
 
-    audio = torch.from_numpy(audio).float()
 
-    model, get_speech_timestamps = load_vad()
-    timestamps = get_speech_timestamps(
-        audio,
-        model,
-        sampling_rate=SAMPLE_RATE,
-        threshold=VAD_THRESHOLD,
+def to_timestamps(probs, n_samples: int):
+    return vad.probs_to_timestamps(probs, n_samples, threshold=VAD_THRESHOLD)
+
+
+def save_probs(wav_path: Path, digest: str, probs, n_samples: int):
+    tmp = PROBS_DIR / f"{digest}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp,
+        probs=np.asarray(probs, dtype=np.float16),
+        n_samples=n_samples,
+        source=str(wav_path),
     )
+    os.replace(tmp, PROBS_DIR / f"{digest}.npz")
+
+
+def load_probs(digest: str):
+    path = PROBS_DIR / f"{digest}.npz"
+    if not REUSE_PROBS or not path.exists():
+        return None
+    with np.load(path) as data:
+        return data["probs"].astype(np.float32), int(data["n_samples"])
+
+
+def detect_window(wav_path: Path, start: float, end: float, core_start: float, core_end: float):
+    # Probabilities for this window's core only, so adjacent windows tile
+    # the file's probability track exactly. Reads start on the window grid.
+    first = int(start * SAMPLE_RATE) // vad.WINDOW
+    probs = speech_probs([read_range(wav_path, first * vad.WINDOW / SAMPLE_RATE, end)])[0]
+
+    lo = int(core_start * SAMPLE_RATE) // vad.WINDOW
+    hi = first + len(probs) if core_end >= end else int(core_end * SAMPLE_RATE) // vad.WINDOW
+    return lo, probs[lo - first: hi - first]
+
+
+def clear_segments(wav_path: Path, rows=()):
+    # Ordinal names are found by prefix; stable ones through the old manifest rows
+    for old in OUT_DIR.glob(f"{wav_path.stem}_seg*.wav"):
+        old.unlink()
+    for r in rows:
+        if r["source"] == str(wav_path):
+            (OUT_DIR / f"{r['segmentid']}.wav").unlink(missing_ok=True)
+
 
-    merged = merge_segments(timestamps)
-    chunks = chunk_segments(merged)
+def save_manifest(rows):
+    """Write the segment manifest (keeping the previous one) and repack shards from it."""
+    if SEGMENT_MANIFEST.exists():
+        shutil.copyfile(SEGMENT_MANIFEST, PREVIOUS_MANIFEST)  # for remap_segments.py
+    write_manifest(rows, SEGMENT_MANIFEST)
+    if SEGMENT_FORMAT == "shards":
+        in_order = sorted(load_segments(SEGMENT_MANIFEST), key=lambda seg: (str(seg.source), seg.start))
+        paths = shards.write_shards(tqdm(in_order, desc="shards"))
+        print(f"Packed {len(rows)} segments into {len(paths)} {shards.SHARD_FORMAT} shards in {shards.SHARD_DIR}/")
 
-    base = wav_path.stem
-    count = 0
+
+def segment_id(wav_path: Path, digest: str, i: int, start: int, end: int) -> str:
+    if SEGMENT_IDS == "stable":
+        return f"{digest[:12]}_{start:010d}_{end:010d}"
+    return f"{wav_path.stem}_seg{i:03d}"
+
+
+def write_segments(wav_path: Path, probs, n_samples: int, audio: np.ndarray = None, digest: str = None):
+    """Cut one source into segments; returns (manifest rows, speech seconds)."""
+    chunks, speech_sec = segment_plan(probs, n_samples, wav_path)
+    if SEGMENT_IDS == "stable" and digest is None:
+        digest = file_sha256(wav_path)
+
+    rows = []
 
     for i, (s, e) in enumerate(chunks):
-        out_path = OUT_DIR / f"{base}_seg{i:03d}.wav"
-        segment = audio[int(s * SAMPLE_RATE): int(e * SAMPLE_RATE)].numpy()
-        sf.write(out_path, segment, SAMPLE_RATE)
-        count += 1
+        start, end = int(s * SAMPLE_RATE), int(e * SAMPLE_RATE)
+        seg_id = segment_id(wav_path, digest, i, start, end)
+        rows.append({
+            "segmentid": seg_id,
+            "source": str(wav_path),
+            "start_sample": start,
+            "end_sample": end,
+        })
+        if SEGMENT_FORMAT != "wav":
+            continue
+
+        if audio is None:
+            segment = read_range(wav_path, s, e)
+        else:
+            segment = audio[start:end]
+        sf.write(OUT_DIR / f"{seg_id}.wav", segment, SAMPLE_RATE)
+
+    return rows, speech_sec
+
+
+def finish_windows(wav_path: Path, track, n_samples: int):
+    digest = file_sha256(wav_path)
+    save_probs(wav_path, digest, track, n_samples)
+    return write_segments(wav_path, track, n_samples, digest=digest)
+
 
-    return count
+def resegment_file(wav_path: Path, digest: str):
+    # No model involved: stored probabilities -> timestamps -> segments
+    probs, n_samples = load_probs(digest)
+    return write_segments(wav_path, probs, n_samples, digest=digest)
+
+
+def process_file(wav_path: Path):
+    digest = file_sha256(wav_path)
+    cached = load_probs(digest)
+
+    if STREAMING:
+        if cached is None:
+            model, _ = get_vad()
+            cached = vad.stream_speech_probs(model, read_blocks(wav_path, STREAM_BLOCK_SEC))
+            save_probs(wav_path, digest, *cached)
+        return write_segments(wav_path, *cached, digest=digest)
+
+    # float32 mono 16 kHz, decoded on demand from WAV, FLAC or native streams
+    audio = read_audio(wav_path)
+    if cached is None:
+        cached = speech_probs([audio])[0], len(audio)
+        save_probs(wav_path, digest, *cached)
+    return write_segments(wav_path, *cached, audio, digest)
+
+
+def process_batch(wav_paths):
+    digests = [file_sha256(w) for w in wav_paths]
+    audios = [read_audio(w) for w in wav_paths]
+    cached = [load_probs(d) for d in digests]
+
+    todo = [i for i, c in enumerate(cached) if c is None]
+    for i, probs in zip(todo, speech_probs([audios[i] for i in todo])):
+        cached[i] = probs, len(audios[i])
+        save_probs(wav_paths[i], digests[i], *cached[i])
+
+    rows, speech_sec = [], 0.0
+    for w, c, a, d in zip(wav_paths, cached, audios, digests):
+        file_rows, file_speech = write_segments(w, *c, a, d)
+        rows.extend(file_rows)
+        speech_sec += file_speech
+    return rows, speech_sec
+
+
+def batch_short_files(durations):
+    """Group short files into jobs of at most BATCH_SEC audio, longest first."""
+    short = sorted(
+        (w for w, d in durations.items() if d < BATCH_FILE_SEC),
+        key=durations.get,
+        reverse=True,
+    )
+    batches, current, total = [], [], 0.0
+    for w in short:
+        if current and total + durations[w] > BATCH_SEC:
+            batches.append(current)
+            current, total = [], 0.0
+        current.append(w)
+        total += durations[w]
+    if current:
+        batches.append(current)
+    return batches
 
 
 def main():
-    wav_files = list(IN_DIR.glob("*.wav"))
-    assert wav_files, "No WAV files found in audio_clean_p2/"
+    wav_files = list_audio(IN_DIR)
+    assert wav_files, "No audio files found in audio_clean_p2/"
 
     workers = max(1, os.cpu_count() - 1)
-    total = 0
+    rows = []
+    speech_sec = 0.0
+    gate_windows = np.zeros(2, dtype=np.int64)
+    start = time.monotonic()
+
+    # Every source is re-cut below, so its old segment files go first; stable
+    # IDs from a run that cut more segments would otherwise stay behind
+    old_rows = {}
+    if SEGMENT_MANIFEST.exists():
+        for r in manifest_rows(SEGMENT_MANIFEST):
+            old_rows.setdefault(r["source"], []).append(r)
+    for w in wav_files:
+        clear_segments(w, old_rows.get(str(w), []))
 
-    with ProcessPoolExecutor(max_workers=workers) as executor:
-        futures = [executor.submit(process_file, w) for w in wav_files]
-        for f in tqdm(as_completed(futures), total=len(futures)):
-            total += f.result()
+    # Header-only reads; longest work starts first so none is left running alone
+    durations = {w: duration(w) for w in wav_files}
 
-    print(f"Phase 3 complete: generated {total} segments.")
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        sched = LongestFirst(executor, workers)
+        windows = {}
+        batched = set()
+        if VAD_ENGINE == "batched" and not STREAMING:
+            for paths in batch_short_files(durations):
+                batched.update(paths)
+                sched.push(sum(durations[w] for w in paths), ("batch", paths), counted, process_batch, paths)
+
+        for w, dur in durations.items():
+            if w in batched:
+                continue
+            if dur > SPLIT_MIN_SEC:
+                digest = file_sha256(w)
+                if load_probs(digest) is not None:
+                    sched.push(dur, ("file", w), counted, resegment_file, w, digest)
+                    continue
+                ranges = split_ranges(dur, SPLIT_SEC, OVERLAP_SEC)
+                n_samples = int(round(dur * SAMPLE_RATE))
+                track = np.zeros(-(-n_samples // vad.WINDOW), dtype=np.float32)
+                windows[w] = [len(ranges), track, n_samples]
+                for r in ranges:
+                    sched.push(r[1] - r[0], ("window", w), counted, detect_window, w, *r)
+            else:
+                sched.push(dur, ("file", w), counted, process_file, w)
+
+        with tqdm(total=len(wav_files)) as pbar:
+            for (kind, w), (result, gated) in sched.run():
+                gate_windows += gated
+                if kind == "window":
+                    first, probs = result
+                    track = windows[w][1]
+                    track[first: first + len(probs)] = probs[: len(track) - first]
+                    windows[w][0] -= 1
+                    if not windows[w][0]:
+                        _, track, n_samples = windows.pop(w)
+                        sched.push(float("inf"), ("file", w), counted, finish_windows, w, track, n_samples)
+                else:
+                    rows.extend(result[0])
+                    speech_sec += result[1]
+                    pbar.update(len(w) if kind == "batch" else 1)
+
+    save_manifest(rows)
+    throughput.record("phase3", sum(durations.values()), time.monotonic() - start)
+
+    retained = sum(int(r["end_sample"]) - int(r["start_sample"]) for r in rows) / SAMPLE_RATE
+    print(f"Phase 3 complete: generated {len(rows)} segments ({SEGMENT_MANIFEST}).")
+    print(
+        f"Speech retained {retained / 3600:.2f} h, "
+        f"discarded {max(0.0, speech_sec - retained) / 3600:.2f} h (runs under {MIN_SEG_SEC:g} s)"
+    )
+    if gate_windows[0]:
+        print(f"Pre-gate skipped {gate_windows[1] / gate_windows[0]:.1%} of the audio run through VAD")
 
 
 if __name__ == "__main__":
-    main()
+    if "--fetch-vad" in sys.argv:
+        fetch_vad()
+    else:
+        main()
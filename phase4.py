@@ -1,9 +1,11 @@
+import hashlib
 import os
 from pathlib import Path
-import csv
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import torch
-import soundfile as sf
 from tqdm import tqdm
 from dotenv import load_dotenv
 
@@ -21,82 +23,363 @@ torch.load = _patched_load
 
 from pyannote.audio import Pipeline
 
+from audio_io import duration, read_range
+from checkpoints import checkpoint, load_done, open_rows
+from manifest import file_sha256
+from scheduling import LongestFirst, split_ranges
+from segments import SOURCE_TURNS, TURN_FIELDS, load_segments
+from speakers import EMBED_DIR
+
 # ---------------- CONFIG ----------------
-SEG_DIR = Path("audio_segments_p3")
+SEG_DIR = Path("audio_segments_p3")  # or segments.SEGMENT_MANIFEST
 OUT_CSV = "speaker_segments.csv"
+FIELDS = ["segmentid", "segmentspeakerid", "start", "end", "sourcespeakerid"]
 
 HF_TOKEN = os.environ.get("HF_TOKEN")
 assert HF_TOKEN, "Set HF_TOKEN environment variable"
 
 SAMPLE_RATE = 16000
+
+# "segment": diarize every phase3 segment on its own
+# "source": diarize each cleaned source once (needs SEG_DIR = the segment
+# manifest) and clip its turns to the segment boundaries; sourcespeakerid is
+# then shared by every segment of that source. Sources longer than
+# SOURCE_WINDOW_SEC are diarized in windows of about that length, and
+# speaker IDs are only consistent within a window. The turns are also
+# written to segments.SOURCE_TURNS for phase3's speaker-aware packing.
+DIARIZE_MODE = "segment"
+SOURCE_WINDOW_SEC = 3600
+
+# None picks cuda, then mps, then cpu. On cpu, WORKERS (None: cores //
+# THREADS_PER_WORKER) processes each load the pipeline once and take jobs of
+# SEGMENTS_PER_JOB segments (or one source); accelerators run one process.
+DEVICE = None
+WORKERS = None
+THREADS_PER_WORKER = 2
+SEGMENTS_PER_JOB = 64
+
+# Rows are appended to OUT_CSV as jobs finish and fsynced every SYNC_EVERY
+# jobs, then the finished segment IDs are logged to speaker_segments.done
+# with a fingerprint of their audio (source sha256, start and end sample).
+# With RESUME, a restart skips logged segments whose fingerprint still
+# matches, redoes the rest and drops rows of segments no longer listed;
+# False starts over.
+RESUME = True
+SYNC_EVERY = 4
+
+# One pyannote speaker embedding per local speaker (segmentspeakerid, or
+# sourcespeakerid in source mode) is saved to speakers.EMBED_DIR for
+# speakers.py's corpus-wide clustering
+EMBED_DIR.mkdir(parents=True, exist_ok=True)
+
+# Segment mode: run only the pipeline's segmentation model first, and when no
+# chunk of the segment shows a second local speaker active for more than
+# SHORTCUT_MAX_SECOND of its frames, emit one turn over the whole segment
+# (plus its embedding) and skip embedding-per-turn and clustering. A
+# SHORTCUT_AUDIT share of shortcut segments also runs the full pipeline to
+# measure agreement.
+SHORTCUT = False
+SHORTCUT_ONSET = 0.5
+SHORTCUT_MAX_SECOND = 0.02
+SHORTCUT_AUDIT = 0.02
 # --------------------------------------
 
 
-def main():
-    pipeline = Pipeline.from_pretrained(
+_pipeline = None
+
+
+def pick_device() -> torch.device:
+    if DEVICE:
+        return torch.device(DEVICE)
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cpu")
+
+
+def load_pipeline():
+    return Pipeline.from_pretrained(
         "pyannote/speaker-diarization-community-1",
         token=HF_TOKEN,
-    ).to(torch.device("mps"))
+    ).to(pick_device())
+
 
+def init_worker(threads: int):
+    # One pipeline per worker process, with intra-op threads capped so
+    # workers x threads stays within the cores
+    global _pipeline
+    torch.set_num_threads(threads)
+    _pipeline = load_pipeline()
+
+
+def get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = load_pipeline()
+    return _pipeline
+
+
+def turns_of(audio):
+    """([(start, end, pyannote label), ...] in seconds into audio, {label: embedding})."""
+    diarization = get_pipeline()(
+        {
+            "waveform": torch.from_numpy(audio).unsqueeze(0),
+            "sample_rate": SAMPLE_RATE,
+        }
+    )
+
+    # Get annotation object
+    annotation = (
+        diarization.speaker_diarization
+        if hasattr(diarization, "speaker_diarization")
+        else diarization
+    )
+    turns = [(turn.start, turn.end, speaker) for turn, _, speaker in annotation.itertracks(yield_label=True)]
+
+    # One centroid embedding per speaker, in annotation.labels() order; rows
+    # are NaN for speakers with too little clean speech to embed
+    vectors = getattr(diarization, "speaker_embeddings", None)
+    embeddings = {}
+    if vectors is not None:
+        for label, vec in zip(annotation.labels(), np.asarray(vectors, dtype=np.float32)):
+            if np.isfinite(vec).all():
+                embeddings[label] = vec
+    return turns, embeddings
+
+
+def segment_rows(segment_id: str, turns, offset: float = 0.0, end: float = None):
+    # turns: (start, end, source-level speaker ID) in source seconds; the
+    # segment spans [offset, end). Speakers get segment-local IDs in order
+    # of first appearance.
+    speaker_map = {}
     rows = []
+    for ts, te, speaker in turns:
+        if end is not None and (ts >= end or te <= offset):
+            continue
+        if speaker not in speaker_map:
+            speaker_map[speaker] = f"{segment_id}speaker{len(speaker_map) + 1:02d}"
+        rows.append({
+            "segmentid": segment_id,
+            "segmentspeakerid": speaker_map[speaker],
+            "start": max(ts, offset) - offset,
+            "end": (te if end is None else min(te, end)) - offset,
+            "sourcespeakerid": speaker,
+        })
+    return rows
 
-    wav_files = sorted(SEG_DIR.glob("*.wav"))
-    assert wav_files, "No segment WAVs found"
 
-    for wav_path in tqdm(wav_files):
-        audio, sr = sf.read(wav_path)
+def single_speaker(audio) -> bool:
+    """True when the segmentation model alone says one speaker talks throughout."""
+    # (chunks, frames, local speakers) activations over overlapping chunks, so
+    # a speaker change anywhere in the segment falls inside some chunk
+    activations = get_pipeline()._segmentation(
+        {"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE}
+    ).data
+    active = (activations > SHORTCUT_ONSET).mean(axis=1)
+    if active.shape[1] < 2:
+        return bool(active.max() > 0)
+    second = np.sort(active, axis=1)[:, -2]
+    return bool(active.max() > 0 and second.max() <= SHORTCUT_MAX_SECOND)
 
-        if sr != SAMPLE_RATE:
-            raise RuntimeError(f"{wav_path.name} has sr={sr}")
 
-        if audio.ndim == 2:
-            audio = audio.mean(axis=1)
+def single_embedding(audio) -> dict:
+    # Whole-segment embedding from the pipeline's own model, keyed like turns_of's labels
+    vec = np.asarray(get_pipeline()._embedding(torch.from_numpy(audio)[None, None])[0], dtype=np.float32)
+    return {"single": vec} if np.isfinite(vec).all() else {}
 
-        waveform = torch.from_numpy(audio).float().unsqueeze(0)
 
-        diarization = pipeline(
-            {
-                "waveform": waveform,
-                "sample_rate": SAMPLE_RATE,
-            }
-        )
+def audited(segment_id: str) -> bool:
+    # Hash-based so the audit sample is the same whichever worker gets the segment
+    return int(hashlib.sha1(segment_id.encode()).hexdigest()[:8], 16) < SHORTCUT_AUDIT * 2 ** 32
+
+
+def diarize_segments(segments):
+    """One job of segment mode: (rows, no source turns, {segmentspeakerid: embedding}, shortcut counts)."""
+    rows, embeddings, counts = [], {}, Counter(segments=len(segments))
+    for seg in segments:
+        # float32 mono 16 kHz, sliced lazily from the source in manifest mode
+        audio = seg.read()
+        if SHORTCUT and single_speaker(audio):
+            counts["shortcut"] += 1
+            turns, vectors = [(0.0, len(audio) / SAMPLE_RATE, "single")], single_embedding(audio)
+            if audited(seg.segment_id):
+                full_turns, _ = turns_of(audio)
+                counts["audited"] += 1
+                counts["agreed"] += len({speaker for _, _, speaker in full_turns}) <= 1
+        else:
+            turns, vectors = turns_of(audio)
+        seg_rows = segment_rows(seg.segment_id, turns)
+        # No source context: the segment-local ID is the only one there is
+        for r in seg_rows:
+            label = r["sourcespeakerid"]
+            if label in vectors:
+                embeddings[r["segmentspeakerid"]] = vectors[label]
+            r["sourcespeakerid"] = ""
+        rows.extend(seg_rows)
+    return rows, [], embeddings, counts
 
-        # Get annotation object
-        annotation = (
-            diarization.speaker_diarization
-            if hasattr(diarization, "speaker_diarization")
-            else diarization
-        )
 
-        segment_id = wav_path.stem
-
-        # map pyannote speaker labels → segment-local speaker IDs
-        speaker_map = {}
-        speaker_counter = 1
-
-        for turn, _, speaker in annotation.itertracks(yield_label=True):
-            if speaker not in speaker_map:
-                speaker_map[speaker] = (
-                    f"{segment_id}speaker{speaker_counter:02d}"
-                )
-                speaker_counter += 1
-
-            rows.append({
-                "segmentid": segment_id,
-                "segmentspeakerid": speaker_map[speaker],
-                "start": turn.start,
-                "end": turn.end,
-            })
-
-    with open(OUT_CSV, "w", newline="") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=["segmentid", "segmentspeakerid", "start", "end"]
+def diarize_source(source: Path):
+    """Source-level turns [(start, end, sourcespeakerid), ...] and {sourcespeakerid: embedding}."""
+    total = duration(source)
+    windows = split_ranges(total, SOURCE_WINDOW_SEC, 0.0) if SOURCE_WINDOW_SEC else [(0.0, total, 0.0, total)]
+    turns, embeddings = [], {}
+    for k, (lo, hi, _, _) in enumerate(windows):
+        prefix = source.stem if len(windows) == 1 else f"{source.stem}_w{k:02d}"
+        labels = {}
+        window_turns, vectors = turns_of(read_range(source, lo, hi))
+        for ts, te, speaker in window_turns:
+            labels.setdefault(speaker, f"{prefix}_speaker{len(labels) + 1:02d}")
+            turns.append((lo + ts, lo + te, labels[speaker]))
+        embeddings.update((labels[sp], vec) for sp, vec in vectors.items() if sp in labels)
+    return turns, embeddings
+
+
+def diarize_source_segments(source: Path, segments):
+    """One job of source mode: (rows for the source's segments, source turn rows, embeddings, no counts)."""
+    turns, embeddings = diarize_source(source)
+    rows = []
+    for seg in segments:
+        rows.extend(segment_rows(seg.segment_id, turns, seg.start / SAMPLE_RATE, seg.end / SAMPLE_RATE))
+    turn_rows = [{"source": str(source), "speaker": sp, "start": s, "end": e} for s, e, sp in turns]
+    return rows, turn_rows, embeddings, Counter()
+
+
+def jobs(segments, done=frozenset()):
+    """(cost in seconds, segment IDs, fn, args) per unit of work still to do for DIARIZE_MODE."""
+    if DIARIZE_MODE != "source":
+        def cost(segs):
+            return sum((s.end - s.start) / SAMPLE_RATE if s.end is not None else 1.0 for s in segs)
+        todo = [s for s in segments if s.segment_id not in done]
+        chunks = [todo[i: i + SEGMENTS_PER_JOB] for i in range(0, len(todo), SEGMENTS_PER_JOB)]
+        return [(cost(c), [s.segment_id for s in c], diarize_segments, (c,)) for c in chunks]
+
+    by_source = {}
+    for seg in segments:
+        assert seg.end is not None, "DIARIZE_MODE = 'source' needs SEG_DIR to be the segment manifest"
+        by_source.setdefault(seg.source, []).append(seg)
+    # A source is redone whole if any of its segments is new
+    return [
+        (duration(src), [s.segment_id for s in segs], diarize_source_segments, (src, segs))
+        for src, segs in by_source.items()
+        if any(s.segment_id not in done for s in segs)
+    ]
+
+
+def run_jobs(todo):
+    """Yield (segment IDs, (rows, source turn rows, embeddings, shortcut counts)) as jobs finish."""
+    # Accelerators: one in-process pipeline. CPU: worker processes sharing
+    # the cores, longest jobs first so no long source is left running alone.
+    device = pick_device()
+    workers = WORKERS or (max(1, (os.cpu_count() or 1) // THREADS_PER_WORKER) if device.type == "cpu" else 1)
+    print(f"Diarizing on {device} with {workers} worker(s)")
+
+    if workers == 1:
+        for _, ids, fn, args in todo:
+            yield ids, fn(*args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(THREADS_PER_WORKER,)) as executor:
+        sched = LongestFirst(executor, workers)
+        for cost, ids, fn, args in todo:
+            sched.push(cost, ids, fn, *args)
+        yield from sched.run()
+
+
+def done_path() -> Path:
+    return Path(OUT_CSV).with_suffix(".done")
+
+
+def fingerprints(segments):
+    """{segment ID: "<source sha256>:<start>:<end>"}, hashing each source once."""
+    digests = {}
+    out = {}
+    for seg in segments:
+        if seg.source not in digests:
+            digests[seg.source] = file_sha256(seg.source)
+        out[seg.segment_id] = f"{digests[seg.source]}:{seg.start}:{seg.end}"
+    return out
+
+
+def save_embeddings(ids, embeddings):
+    # One file per job, named by its segments, so a redone job replaces its own
+    if not embeddings:
+        return
+    name = hashlib.sha1("\n".join(ids).encode()).hexdigest()[:16]
+    tmp = EMBED_DIR / f"{name}.tmp.npz"
+    np.savez(tmp, keys=np.array(list(embeddings)), vectors=np.stack(list(embeddings.values())))
+    os.replace(tmp, EMBED_DIR / f"{name}.npz")
+
+
+def main():
+    segments = load_segments(SEG_DIR)
+    assert segments, "No segments found"
+
+    prints = fingerprints(segments)
+    logged, sizes = load_done(done_path()) if RESUME else ({}, None)
+    # A logged ID only counts while it still names the same audio; ordinal IDs
+    # are reused for different ranges when phase3 re-cuts a source
+    done = {seg_id for seg_id, fp in logged.items() if prints.get(seg_id) == fp}
+    todo = jobs(segments, done)
+    redo = {seg_id for _, ids, _, _ in todo for seg_id in ids}
+    done -= redo
+    # Rows of changed, redone or no longer listed segments are dropped
+    stale = set(logged) - done
+    redo_sources = {str(args[0]) for _, _, fn, args in todo if fn is diarize_source_segments}
+    print(f"{len(segments) - len(redo)} segments already diarized, {len(redo)} to go")
+
+    out, writer = open_rows(
+        OUT_CSV, FIELDS, sizes[0] if sizes else None,
+        (lambda r: r["segmentid"] in done) if stale else None,
+    )
+    outputs = [out]
+    turns_writer = None
+    rewrite = bool(stale)
+    if DIARIZE_MODE == "source":
+        # A redone source's old turns go even when none of its IDs survive
+        # (stable IDs after re-cleaning), or phase3 would read both sets
+        kept_sources = {str(seg.source) for seg in segments} - redo_sources
+        turns_out, turns_writer = open_rows(
+            SOURCE_TURNS, TURN_FIELDS, sizes[1] if sizes and len(sizes) > 1 else None,
+            (lambda r: r["source"] in kept_sources) if stale or redo_sources else None,
         )
-        writer.writeheader()
-        writer.writerows(rows)
+        outputs.append(turns_out)
+        rewrite = rewrite or bool(redo_sources)
 
-    print(f"Phase 4 complete: wrote {len(rows)} diarization rows to {OUT_CSV}")
+    # A fresh or rewritten start gets a new done log; otherwise it is appended to
+    if sizes is None or rewrite:
+        done_log = open(done_path(), "w")
+        checkpoint(outputs, done_log, sorted((seg_id, prints[seg_id]) for seg_id in done))
+    else:
+        done_log = open(done_path(), "a")
+
+    # Rows are fsynced before their segment IDs are logged as done, so a
+    # crash costs at most SYNC_EVERY jobs, and resuming only truncates the
+    # outputs back to the last checkpoint
+    n_rows, pending = 0, []
+    shortcut = Counter()
+    for k, (ids, (job_rows, job_turns, embeddings, counts)) in enumerate(tqdm(run_jobs(todo), total=len(todo)), 1):
+        shortcut += counts
+        save_embeddings(ids, embeddings)
+        writer.writerows(job_rows)
+        if turns_writer:
+            turns_writer.writerows(job_turns)
+        n_rows += len(job_rows)
+        pending.extend((seg_id, prints[seg_id]) for seg_id in ids)
+        if k % SYNC_EVERY == 0:
+            checkpoint(outputs, done_log, pending)
+    checkpoint(outputs, done_log, pending)
+    for f in outputs + [done_log]:
+        f.close()
+
+    print(f"Phase 4 complete: wrote {n_rows} diarization rows to {OUT_CSV}")
+    if shortcut["segments"] and SHORTCUT:
+        print(
+            f"Single-speaker shortcut took {shortcut['shortcut']}/{shortcut['segments']} segments "
+            f"({shortcut['shortcut'] / shortcut['segments']:.1%}); full pipeline agreed on "
+            f"{shortcut['agreed']}/{shortcut['audited']} audited"
+        )
 
 
 if __name__ == "__main__":
@@ -10,6 +10,8 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
+from segments import load_segments
+
 def transcribe(audio_bytes: bytes) -> str:
     response = client.models.generate_content(
         model="models/gemini-2.5-flash",
@@ -29,7 +31,7 @@ def transcribe(audio_bytes: bytes) -> str:
 
 
 # ---------------- CONFIG ----------------
-SEG_DIR = Path("audio_segments_p3")
+SEG_DIR = Path("audio_segments_p3")  # or segments.SEGMENT_MANIFEST
 OUT_CSV = "segment_transcripts_gemini.csv"
 
 MODEL_ID = "models/gemini-2.5-flash"
@@ -46,10 +48,9 @@ assert GEMINI_API_KEY, "GEMINI_API_KEY not set"
 
 client = genai.Client(api_key=GEMINI_API_KEY)
 
-def load_audio_bytes(wav_path: Path) -> bytes:
-    """Load WAV file and return as bytes"""
-    with open(wav_path, 'rb') as f:
-        return f.read()
+def load_audio_bytes(seg) -> bytes:
+    """Load segment and return as WAV bytes"""
+    return seg.wav_bytes()
 
 
 
@@ -57,23 +58,23 @@ def load_audio_bytes(wav_path: Path) -> bytes:
 
 
 def main():
-    # Get all WAV files from the directory
-    all_wav_files = sorted(SEG_DIR.glob("*.wav"))
+    # Get all segments from the directory or manifest
+    all_wav_files = load_segments(SEG_DIR)
     wav_files = all_wav_files[SKIP_FILES:SKIP_FILES + MAX_FILES]
     
     if not wav_files:
-        print(f"No WAV files found in {SEG_DIR} (skipping first {SKIP_FILES})")
+        print(f"No segments found in {SEG_DIR} (skipping first {SKIP_FILES})")
         return
     
     print(f"Processing files {SKIP_FILES+1} to {SKIP_FILES+len(wav_files)} (total: {len(wav_files)} files)")
     
     rows = []
 
-    for idx, wav_path in enumerate(tqdm(wav_files, desc="Transcribing")):
-        segment_id = wav_path.stem  # filename without extension
+    for idx, seg in enumerate(tqdm(wav_files, desc="Transcribing")):
+        segment_id = seg.segment_id
 
         try:
-            audio_bytes = load_audio_bytes(wav_path)
+            audio_bytes = load_audio_bytes(seg)
             text = transcribe(audio_bytes)
             
             # Rate limiting: wait between requests
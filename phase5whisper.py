@@ -1,14 +1,15 @@
 import os
 from pathlib import Path
 import pandas as pd
-import soundfile as sf
 from tqdm import tqdm
 import torch
 
 from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
 
+from segments import load_segments
+
 # ---------------- CONFIG ----------------
-SEG_DIR = Path("audio_segments_p3")
+SEG_DIR = Path("audio_segments_p3")  # or segments.SEGMENT_MANIFEST
 OUT_CSV = "segment_transcripts_whisper.csv"
 
 MODEL_ID = "openai/whisper-large-v3"
@@ -34,14 +35,8 @@ def load_whisper():
     return processor, model, device
 
 
-def transcribe_whisper(wav_path: Path, processor, model, device) -> str:
-    audio, sr = sf.read(wav_path)
-
-    if sr != SAMPLE_RATE:
-        raise RuntimeError(f"{wav_path.name} has sr={sr}")
-
-    if audio.ndim == 2:
-        audio = audio.mean(axis=1)
+def transcribe_whisper(seg, processor, model, device) -> str:
+    audio = seg.read()
 
     inputs = processor(
         audio,
@@ -71,11 +66,11 @@ def transcribe_whisper(wav_path: Path, processor, model, device) -> str:
 
 
 def main():
-    # Get all WAV files from the directory
-    wav_files = sorted(SEG_DIR.glob("*.wav"))[:MAX_FILES]
+    # Get all segments from the directory or manifest
+    wav_files = load_segments(SEG_DIR)[:MAX_FILES]
     
     if not wav_files:
-        print(f"No WAV files found in {SEG_DIR}")
+        print(f"No segments found in {SEG_DIR}")
         return
     
     print(f"Found {len(wav_files)} audio files to transcribe")
@@ -83,12 +78,12 @@ def main():
     processor, model, device = load_whisper()
     rows = []
 
-    for wav_path in tqdm(wav_files, desc="Transcribing"):
-        segment_id = wav_path.stem  # filename without extension
+    for seg in tqdm(wav_files, desc="Transcribing"):
+        segment_id = seg.segment_id
 
         try:
             text = transcribe_whisper(
-                wav_path,
+                seg,
                 processor,
                 model,
                 device,
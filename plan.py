@@ -0,0 +1,213 @@
+import json
+import shutil
+import sys
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+import sources
+import throughput
+from formats import best_audio, estimated_size, smallest_audio
+from manifest import Manifest, dedupe_urls
+
+# ---------------- CONFIG ----------------
+CACHE_DIR = Path("metadata_cache")
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+WAV_BYTES_PER_SEC = 16000 * 2   # 16 kHz mono s16
+FLAC_RATIO = 0.6                # typical FLAC size relative to WAV for speech
+SPEECH_FRACTION = 0.8           # share of cleaned audio phase3 keeps as segments
+
+# Used until main.py / phase2.py / phase3.py have recorded real numbers in
+# throughput.json; rough figures for a single mid-range box.
+DEFAULT_BANDWIDTH = 5e6         # bytes/s
+DEFAULT_REALTIME = {"phase2": 50.0, "phase3": 30.0}
+# --------------------------------------
+
+ydl_opts = {
+    "quiet": True,
+    "skip_download": True,
+}
+
+
+def expand(url: str, depth: int = 0):
+    """Yield video URLs from a video, playlist or channel URL."""
+    with yt_dlp.YoutubeDL(dict(ydl_opts, extract_flat="in_playlist")) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    if info.get("_type") != "playlist":
+        yield info.get("webpage_url") or url
+        return
+
+    for entry in info.get("entries") or []:
+        if not entry:
+            continue
+        entry_url = entry.get("url") or entry.get("webpage_url")
+        # Channel pages list their tabs (Videos, Shorts, ...) as nested playlists
+        if depth < 2 and (entry.get("_type") == "playlist" or entry.get("ie_key") == "YoutubeTab"):
+            yield from expand(entry_url, depth + 1)
+        elif entry_url:
+            yield entry_url
+
+
+def audio_formats(info):
+    out = []
+    for f in info.get("formats") or []:
+        if f.get("acodec") in (None, "none") or f.get("vcodec") not in (None, "none"):
+            continue
+        out.append({
+            "format_id": f.get("format_id"),
+            "ext": f.get("ext"),
+            "acodec": f.get("acodec"),
+            "abr": f.get("abr"),
+            "asr": f.get("asr"),
+            "language": f.get("language"),
+            "filesize": f.get("filesize") or f.get("filesize_approx"),
+        })
+    return out
+
+
+def fetch_meta(key: str, url: str, refresh: bool = False):
+    cache_path = CACHE_DIR / f"{key.replace('/', '_')}.json"
+    if cache_path.exists() and not refresh:
+        with open(cache_path) as f:
+            return json.load(f)
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    formats = audio_formats(info)
+    meta = {
+        "key": key,
+        "url": url,
+        "id": info.get("id"),
+        "title": info.get("title"),
+        "channel": info.get("channel") or info.get("uploader"),
+        "duration": info.get("duration") or 0,
+        "language": info.get("language") or next((f["language"] for f in formats if f["language"]), None),
+        "formats": formats,
+    }
+    with open(cache_path, "w") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    return meta
+
+
+def planned_seconds(meta) -> float:
+    # Same section policy main.py will apply when downloading
+    sections = [s for s in sources.requested_sections(meta, None) if s]
+    if not sections:
+        return float(meta["duration"])
+    return sum(s["end_time"] - s["start_time"] for s in sections)
+
+
+def download_bytes(meta, seconds: float) -> float:
+    # Same stream main.py will pick, scaled down to the planned sections
+    if sources.FORMAT_SELECTION == "asr":
+        chosen = smallest_audio(meta["formats"], meta["duration"])
+    else:
+        chosen = best_audio(meta["formats"])
+    if chosen is None or not meta["duration"]:
+        return seconds * WAV_BYTES_PER_SEC
+    return estimated_size(chosen, meta["duration"]) * seconds / meta["duration"]
+
+
+def stored_bytes(raw_bytes: float, seconds: float) -> float:
+    if sources.STORE_FORMAT == "native":
+        return raw_bytes
+    if sources.STORE_FORMAT == "flac":
+        return seconds * WAV_BYTES_PER_SEC * FLAC_RATIO
+    return seconds * WAV_BYTES_PER_SEC
+
+
+def fmt_hms(sec: float) -> str:
+    sec = int(sec)
+    return f"{sec // 3600}:{sec % 3600 // 60:02d}:{sec % 60:02d}"
+
+
+def report(metas):
+    print(f"{'id':<14} {'duration':>9} {'planned':>9} {'lang':<6} audio formats")
+    for m in metas:
+        formats = ", ".join(
+            f"{f['format_id']} {f['acodec']} {f['abr'] or 0:.0f}k" for f in m["formats"]
+        )
+        print(
+            f"{m['id']:<14} {fmt_hms(m['duration']):>9} {fmt_hms(m['planned']):>9} "
+            f"{m['language'] or '-':<6} {formats}"
+        )
+
+    seconds = sum(m["planned"] for m in metas)
+    raw = sum(m["raw_bytes"] for m in metas)
+    stored = sum(stored_bytes(m["raw_bytes"], m["planned"]) for m in metas)
+    if sources.INGEST_MODE == "fused":
+        stored = 0
+    cleaned = seconds * WAV_BYTES_PER_SEC
+    segments = seconds * SPEECH_FRACTION * WAV_BYTES_PER_SEC
+
+    bandwidth = throughput.bytes_per_sec("download", DEFAULT_BANDWIDTH)
+    walls = {
+        "download": raw / bandwidth,
+        "phase2": seconds / throughput.realtime_factor("phase2", DEFAULT_REALTIME["phase2"]),
+        "phase3": seconds / throughput.realtime_factor("phase3", DEFAULT_REALTIME["phase3"]),
+    }
+    measured = throughput.load()
+
+    print(f"\n{len(metas)} videos, {seconds / 3600:.2f} h of audio to fetch")
+    print(f"{'stage':<10} {'disk':>10} {'wall':>10}")
+    print(f"{'download':<10} {raw / 1e9:>8.2f}GB {fmt_hms(walls['download']):>10}")
+    print(f"{'phase1':<10} {stored / 1e9:>8.2f}GB {'(overlaps download)':>10}")
+    print(f"{'phase2':<10} {cleaned / 1e9:>8.2f}GB {fmt_hms(walls['phase2']):>10}")
+    print(f"{'phase3':<10} {segments / 1e9:>8.2f}GB {fmt_hms(walls['phase3']):>10}")
+    unmeasured = [p for p in walls if p not in measured]
+    if unmeasured:
+        print(f"(default throughput used for: {', '.join(unmeasured)})")
+
+    total = stored + cleaned + segments
+    free = shutil.disk_usage(".").free
+    if total > free:
+        print(f"\nWARNING: batch needs ~{total / 1e9:.1f} GB but only {free / 1e9:.1f} GB free")
+
+
+def plan(urls, refresh=False):
+    manifest = Manifest(sources.MANIFEST_PATH)
+    failed = []
+
+    # A private, removed or geo-blocked video is reported and left out, the
+    # same way main.py carries on past a failed download
+    def try_expand(url):
+        try:
+            return list(expand(url))
+        except yt_dlp.utils.DownloadError as e:
+            failed.append((url, e))
+            return []
+
+    def try_fetch_meta(key, url):
+        try:
+            return fetch_meta(key, url, refresh=refresh)
+        except yt_dlp.utils.DownloadError as e:
+            failed.append((url, e))
+            return None
+
+    with ThreadPoolExecutor(max_workers=sources.DOWNLOAD_WORKERS) as executor:
+        expanded = [u for urls_ in executor.map(try_expand, urls) for u in urls_]
+        pending = [(k, u) for k, u in dedupe_urls(expanded) if not manifest.is_done(k)]
+        metas = [m for m in executor.map(lambda ku: try_fetch_meta(*ku), pending) if m is not None]
+
+    for m in metas:
+        m["planned"] = planned_seconds(m)
+        m["raw_bytes"] = download_bytes(m, m["planned"])
+
+    print(f"{len(expanded)} videos found, {len(expanded) - len(pending)} already downloaded or duplicated\n")
+    report(metas)
+    for url, e in failed:
+        print(f"FAILED {url}: {e}")
+
+
+def run():
+    # python plan.py [--refresh] [URL ...]  (defaults to sources.YOUTUBE_URLS)
+    args = [a for a in sys.argv[1:] if a != "--refresh"]
+    plan(args or sources.YOUTUBE_URLS, refresh="--refresh" in sys.argv)
+
+
+if __name__ == "__main__":
+    run()
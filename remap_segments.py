@@ -0,0 +1,132 @@
+import argparse
+import csv
+from pathlib import Path
+
+from segments import PREVIOUS_MANIFEST, SEGMENT_MANIFEST, SAMPLE_RATE, manifest_rows
+
+# ---------------- CONFIG ----------------
+TRANSCRIPT_CSVS = ["segment_transcripts_gemini.csv", "segment_transcripts_whisper.csv"]
+SPEAKER_CSV = "speaker_segments.csv"
+MIN_IOU = 0.9        # a transcript only carries over to a near-identical segment
+# --------------------------------------
+
+
+def spans_by_source(rows):
+    spans = {}
+    for r in rows:
+        spans.setdefault(r["source"], []).append((int(r["start_sample"]), int(r["end_sample"]), r["segmentid"]))
+    for v in spans.values():
+        v.sort()
+    return spans
+
+
+def overlaps(span, candidates):
+    s, e = span
+    for c in candidates:
+        if c[0] >= e:
+            break
+        if c[1] > s:
+            yield c
+
+
+def match_segments(old_rows, new_rows):
+    """{new segmentid: old segmentid} for pairs covering the same audio (IoU >= MIN_IOU)."""
+    old = spans_by_source(old_rows)
+    matches = {}
+    for source, spans in spans_by_source(new_rows).items():
+        for s, e, new_id in spans:
+            for o_start, o_end, old_id in overlaps((s, e), old.get(source, [])):
+                inter = min(e, o_end) - max(s, o_start)
+                union = max(e, o_end) - min(s, o_start)
+                if union and inter / union >= MIN_IOU:
+                    matches[new_id] = old_id
+                    break
+    return matches
+
+
+def remap_transcripts(path: Path, matches, new_ids):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames
+        by_old = {r["segmentid"]: r for r in reader}
+
+    rows = []
+    for new_id in new_ids:
+        old = by_old.get(matches.get(new_id))
+        if old is not None:
+            rows.append(dict(old, segmentid=new_id))
+
+    out = path.with_suffix(".remapped.csv")
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"{path}: {len(rows)}/{len(new_ids)} segments carried over, "
+          f"{len(new_ids) - len(rows)} need transcribing -> {out}")
+
+
+def remap_speakers(path: Path, old_rows, new_rows):
+    # Diarization turns are time ranges, so they move onto any overlapping new
+    # segment: lift to source time, clip to the new segment, make relative again
+    old_start = {r["segmentid"]: (r["source"], int(r["start_sample"]) / SAMPLE_RATE) for r in old_rows}
+    turns = {}
+    with open(path, newline="") as f:
+        for r in csv.DictReader(f):
+            if r["segmentid"] not in old_start:
+                continue
+            source, offset = old_start[r["segmentid"]]
+            turns.setdefault(source, []).append(
+                (offset + float(r["start"]), offset + float(r["end"]), r["segmentspeakerid"],
+                 r.get("sourcespeakerid", ""))
+            )
+    for v in turns.values():
+        v.sort()
+
+    rows, covered = [], 0
+    for r in sorted(new_rows, key=lambda r: r["segmentid"]):
+        s, e = int(r["start_sample"]) / SAMPLE_RATE, int(r["end_sample"]) / SAMPLE_RATE
+        speaker_map = {}
+        for ts, te, speaker, source_speaker in overlaps((s, e), turns.get(r["source"], [])):
+            if speaker not in speaker_map:
+                speaker_map[speaker] = f"{r['segmentid']}speaker{len(speaker_map) + 1:02d}"
+            rows.append({
+                "segmentid": r["segmentid"],
+                "segmentspeakerid": speaker_map[speaker],
+                "start": max(ts, s) - s,
+                "end": min(te, e) - s,
+                "sourcespeakerid": source_speaker,
+            })
+        covered += bool(speaker_map)
+
+    out = Path(path).with_suffix(".remapped.csv")
+    with open(out, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["segmentid", "segmentspeakerid", "start", "end", "sourcespeakerid"])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"{path}: {covered}/{len(new_rows)} segments have diarization turns -> {out}")
+
+
+def main():
+    # Carry phase4/phase5 outputs across a re-segmentation (phase3.py or
+    # resegment.py keep the previous manifest as segments_p3.prev.csv)
+    parser = argparse.ArgumentParser(description="Remap transcripts and diarization to new segment IDs")
+    parser.add_argument("--old", type=Path, default=PREVIOUS_MANIFEST)
+    parser.add_argument("--new", type=Path, default=SEGMENT_MANIFEST)
+    args = parser.parse_args()
+
+    old_rows, new_rows = manifest_rows(args.old), manifest_rows(args.new)
+    matches = match_segments(old_rows, new_rows)
+    unchanged = sum(new_id == old_id for new_id, old_id in matches.items())
+    print(f"{len(new_rows)} segments: {unchanged} unchanged, "
+          f"{len(matches) - unchanged} renamed, {len(new_rows) - len(matches)} new")
+
+    new_ids = sorted(r["segmentid"] for r in new_rows)
+    for name in TRANSCRIPT_CSVS:
+        if Path(name).exists():
+            remap_transcripts(Path(name), matches, new_ids)
+    if Path(SPEAKER_CSV).exists():
+        remap_speakers(Path(SPEAKER_CSV), old_rows, new_rows)
+
+
+if __name__ == "__main__":
+    main()
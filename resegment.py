@@ -0,0 +1,89 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+import phase3
+from manifest import file_sha256
+from segments import SEGMENT_MANIFEST, manifest_rows
+
+
+def load_track(path: Path):
+    with np.load(path) as data:
+        return data["probs"].astype(np.float32), int(data["n_samples"]), Path(str(data["source"]))
+
+
+def current_tracks(tracks):
+    """(track path, probs, n_samples, source) for tracks matching their source's current content.
+
+    Tracks are named by the sha256 of the source they were computed from; one
+    whose source is gone or has since been re-cleaned is deleted.
+    """
+    hashes, current = {}, []
+    for track_path in tracks:
+        probs, n_samples, source = load_track(track_path)
+        if not source.exists():
+            print(f"\nSkipping {track_path.name}: source {source} is gone")
+            continue
+        if source not in hashes:
+            hashes[source] = file_sha256(source)
+        if hashes[source] != track_path.stem:
+            print(f"\nRemoving stale {track_path.name}: {source} has changed since")
+            track_path.unlink()
+            continue
+        current.append((track_path, probs, n_samples, source))
+    return current
+
+
+def main():
+    # Re-cut phase3 segments from the stored VAD probability tracks; the
+    # model is never loaded. Defaults come from phase3's CONFIG.
+    parser = argparse.ArgumentParser(description="Re-cut phase3 segments without rerunning VAD")
+    parser.add_argument("--threshold", type=float, default=phase3.VAD_THRESHOLD)
+    parser.add_argument("--merge-gap", type=float, default=phase3.MERGE_GAP_SEC)
+    parser.add_argument("--min-seg", type=float, default=phase3.MIN_SEG_SEC)
+    parser.add_argument("--max-seg", type=float, default=phase3.MAX_SEG_SEC)
+    parser.add_argument("--pack", type=float, default=phase3.PACK_TARGET_SEC, help="pack runs up to N seconds")
+    parser.add_argument("--dry-run", action="store_true", help="report segment counts only")
+    args = parser.parse_args()
+
+    phase3.VAD_THRESHOLD = args.threshold
+    phase3.MERGE_GAP_SEC = args.merge_gap
+    phase3.MIN_SEG_SEC = args.min_seg
+    phase3.MAX_SEG_SEC = args.max_seg
+    phase3.PACK_TARGET_SEC = args.pack
+
+    tracks = sorted(phase3.PROBS_DIR.glob("*.npz"))
+    assert tracks, f"No probability tracks in {phase3.PROBS_DIR}/; run phase3.py first"
+
+    rows = manifest_rows(SEGMENT_MANIFEST) if SEGMENT_MANIFEST.exists() else []
+    current = current_tracks(tracks)
+    assert current, "No probability track matches its source; run phase3.py"
+    total, seconds, speech, cut_time = 0, 0.0, 0.0, 0.0
+    for track_path, probs, n_samples, source in tqdm(current):
+        start = time.perf_counter()
+        chunks, speech_sec = phase3.segment_plan(probs, n_samples, source)
+        cut_time += time.perf_counter() - start
+
+        total += len(chunks)
+        seconds += sum(e - s for s, e in chunks)
+        speech += speech_sec
+        if not args.dry_run:
+            phase3.clear_segments(source, rows)
+            rows = [r for r in rows if r["source"] != str(source)]
+            rows.extend(phase3.write_segments(source, probs, n_samples, digest=track_path.stem)[0])
+
+    if not args.dry_run:
+        phase3.save_manifest(rows)
+
+    print(
+        f"Re-segmented {len(current)} sources into {total} segments "
+        f"({seconds / 3600:.2f} h retained, {max(0.0, speech - seconds) / 3600:.2f} h discarded), "
+        f"{cut_time / len(current) * 1000:.2f} ms/file to cut"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import heapq
+import itertools
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+def split_ranges(duration: float, split_sec: float, overlap_sec: float, grid: float = None):
+    """Cut [0, duration) into ~split_sec pieces, each widened by overlap_sec on both sides.
+
+    Returns (start, end, core_start, core_end) tuples; the core ranges tile the
+    file exactly, the outer ranges overlap their neighbours. With grid, the
+    cuts fall on multiples of grid seconds (overlap_sec should be one too).
+    """
+    n = max(1, round(duration / split_sec))
+    bounds = [duration * i / n for i in range(n + 1)]
+    if grid:
+        bounds = [round(b / grid) * grid for b in bounds[:-1]] + [duration]
+    return [
+        (max(0.0, lo - overlap_sec), min(duration, hi + overlap_sec), lo, hi)
+        for lo, hi in zip(bounds, bounds[1:])
+    ]
+
+
+class LongestFirst:
+    """Keeps `workers` jobs in flight on an executor, always starting the costliest queued one.
+
+    Jobs may be pushed while iterating run(), so follow-up work (chunks after a
+    measurement, a stitch after its chunks) still competes by cost rather than
+    queueing behind everything submitted earlier.
+    """
+
+    def __init__(self, executor, workers: int):
+        self.executor = executor
+        self.workers = workers
+        self._queue = []
+        self._order = itertools.count()
+        self._running = {}
+
+    def push(self, cost: float, tag, fn, *args):
+        heapq.heappush(self._queue, (-cost, next(self._order), tag, fn, args))
+
+    def run(self):
+        """Yield (tag, result) for every job as it completes."""
+        while self._queue or self._running:
+            while self._queue and len(self._running) < self.workers:
+                _, _, tag, fn, args = heapq.heappop(self._queue)
+                self._running[self.executor.submit(fn, *args)] = tag
+
+            done, _ = wait(self._running, return_when=FIRST_COMPLETED)
+            for f in done:
+                yield self._running.pop(f), f.result()
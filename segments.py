@@ -0,0 +1,98 @@
+import csv
+import io
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+import soundfile as sf
+
+from audio_io import SAMPLE_RATE, pcm16_memmap, read_range
+
+# phase3 writes one row per segment here: (segmentid, source, start_sample,
+# end_sample) into a cleaned source under audio_clean_p2/
+SEGMENT_MANIFEST = Path("segments_p3.csv")
+PREVIOUS_MANIFEST = Path("segments_p3.prev.csv")  # kept on rewrite, for remap_segments.py
+FIELDS = ["segmentid", "source", "start_sample", "end_sample"]
+
+# Source-level diarization turns (seconds into the cleaned source), written
+# by phase4's source mode; phase3 uses them to keep packed segments to one speaker
+SOURCE_TURNS = Path("source_turns.csv")
+TURN_FIELDS = ["source", "speaker", "start", "end"]
+
+
+@lru_cache(maxsize=64)
+def _source_map(source: str):
+    return pcm16_memmap(Path(source))
+
+
+class Segment(NamedTuple):
+    segment_id: str
+    source: Path
+    start: int = 0              # samples
+    end: Optional[int] = None   # None: the whole file (segment WAV on disk)
+
+    def pcm16(self):
+        """Zero-copy int16 view into the source when it is a PCM16 WAV, else None."""
+        mapped = _source_map(str(self.source))
+        if mapped is None:
+            return None
+        return mapped[self.start: self.end]
+
+    def read(self) -> np.ndarray:
+        view = self.pcm16()
+        if view is not None:
+            return view.astype(np.float32) / 32768.0
+        if self.end is None:
+            audio, _ = sf.read(str(self.source), dtype="float32", always_2d=True)
+            return audio.mean(axis=1)
+        return read_range(self.source, self.start / SAMPLE_RATE, self.end / SAMPLE_RATE)
+
+    def wav_bytes(self) -> bytes:
+        if self.end is None and self.source.suffix.lower() == ".wav":
+            return self.source.read_bytes()
+        buf = io.BytesIO()
+        view = self.pcm16()
+        sf.write(buf, view if view is not None else self.read(), SAMPLE_RATE, format="WAV", subtype="PCM_16")
+        return buf.getvalue()
+
+
+def manifest_rows(path: Path = SEGMENT_MANIFEST):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def write_manifest(rows, path: Path = SEGMENT_MANIFEST):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda r: (r["source"], int(r["start_sample"]))))
+    tmp.replace(path)
+
+
+@lru_cache(maxsize=1)
+def _turns_by_source(path: str, mtime: float):
+    turns = {}
+    with open(path, newline="") as f:
+        for r in csv.DictReader(f):
+            turns.setdefault(r["source"], []).append((float(r["start"]), float(r["end"]), r["speaker"]))
+    return turns
+
+
+def source_turns(source: Path, path: Path = SOURCE_TURNS):
+    """[(start, end, speaker), ...] for one source, or None without diarization data."""
+    if not path.exists():
+        return None
+    return _turns_by_source(str(path), path.stat().st_mtime).get(str(source))
+
+
+def load_segments(src: Path):
+    """Segments from either a directory of segment WAVs or a segment manifest CSV."""
+    src = Path(src)
+    if src.is_dir():
+        return [Segment(p.stem, p) for p in sorted(src.glob("*.wav"))]
+    return [
+        Segment(r["segmentid"], Path(r["source"]), int(r["start_sample"]), int(r["end_sample"]))
+        for r in sorted(manifest_rows(src), key=lambda r: r["segmentid"])
+    ]
@@ -0,0 +1,161 @@
+# Size-bounded dataset shards of encoded segment audio, so export and later
+# phases read a few large files sequentially instead of one WAV per segment.
+#   tar:     webdataset-style {segmentid}.wav members, stdlib only
+#   parquet: HF datasets Audio layout (audio = {bytes, path}); needs pyarrow
+# Both write index.csv: segmentid -> shard, position (tar data offset / row).
+import csv
+import io
+import tarfile
+from pathlib import Path
+
+# ---------------- CONFIG ----------------
+SHARD_DIR = Path("shards_p3")
+SHARD_FORMAT = "tar"          # "tar" or "parquet"
+SHARD_MAX_BYTES = 512 * 1024 * 1024
+ROW_GROUP = 256               # parquet rows per row group
+INDEX_FIELDS = ["segmentid", "shard", "position", "size", "start_sample", "end_sample", "source"]
+# --------------------------------------
+
+
+def index_path(shard_dir: Path = SHARD_DIR) -> Path:
+    return Path(shard_dir) / "index.csv"
+
+
+class TarShard:
+    def __init__(self, path: Path):
+        self.tar = tarfile.open(path, "w")
+
+    def add(self, seg, data: bytes) -> int:
+        info = tarfile.TarInfo(f"{seg.segment_id}.wav")
+        info.size = len(data)
+        self.tar.addfile(info, io.BytesIO(data))
+        # Data ends at the current offset, padded to a whole block
+        return self.tar.offset - -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+    def close(self):
+        self.tar.close()
+
+
+class ParquetShard:
+    def __init__(self, path: Path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("SHARD_FORMAT = 'parquet' needs pyarrow (pip install pyarrow)")
+        self.pa, self.pq = pa, pq
+        self.path, self.writer = path, None
+        self.rows, self.count = [], 0
+
+    def add(self, seg, data: bytes) -> int:
+        self.rows.append((seg, data))
+        if len(self.rows) >= ROW_GROUP:
+            self.flush()
+        self.count += 1
+        return self.count - 1
+
+    def flush(self):
+        if not self.rows:
+            return
+        table = self.pa.table({
+            "segmentid": [seg.segment_id for seg, _ in self.rows],
+            "audio": [{"bytes": data, "path": f"{seg.segment_id}.wav"} for seg, data in self.rows],
+            "source": [str(seg.source) for seg, _ in self.rows],
+            "start_sample": [seg.start for seg, _ in self.rows],
+            "end_sample": [seg.end for seg, _ in self.rows],
+        })
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def write_shards(segments, shard_dir: Path = SHARD_DIR, fmt: str = SHARD_FORMAT, max_bytes: int = SHARD_MAX_BYTES):
+    """Pack segments into shard_dir/shard-NNNNN.{tar,parquet} plus index.csv; returns the shard paths.
+
+    Segments are written in the order given (manifest order reads each source
+    front to back), and at most one row group of audio is held in memory.
+    """
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    for old in shard_dir.glob("shard-*.*"):
+        old.unlink()
+
+    shard_cls = TarShard if fmt == "tar" else ParquetShard
+    rows, paths = [], []
+    shard, size = None, 0
+    for seg in segments:
+        data = seg.wav_bytes()
+        if shard is None or size + len(data) > max_bytes:
+            if shard is not None:
+                shard.close()
+            paths.append(shard_dir / f"shard-{len(paths):05d}.{fmt}")
+            shard, size = shard_cls(paths[-1]), 0
+        rows.append({
+            "segmentid": seg.segment_id,
+            "shard": paths[-1].name,
+            "position": shard.add(seg, data),
+            "size": len(data),
+            "start_sample": seg.start,
+            "end_sample": seg.end,
+            "source": str(seg.source),
+        })
+        size += len(data)
+    if shard is not None:
+        shard.close()
+
+    tmp = index_path(shard_dir).with_suffix(".tmp")
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    tmp.replace(index_path(shard_dir))
+    return paths
+
+
+def iter_shards(shard_dir: Path = SHARD_DIR):
+    """Yield (segmentid, wav bytes) in shard order, reading each shard sequentially."""
+    shard_dir = Path(shard_dir)
+    for path in sorted(shard_dir.glob("shard-*.tar")):
+        with tarfile.open(path, "r|") as tar:
+            for member in tar:
+                yield Path(member.name).stem, tar.extractfile(member).read()
+
+    parquet = sorted(shard_dir.glob("shard-*.parquet"))
+    if parquet:
+        import pyarrow.parquet as pq
+        for path in parquet:
+            for batch in pq.ParquetFile(path).iter_batches(columns=["segmentid", "audio"]):
+                for seg_id, audio in zip(batch.column(0).to_pylist(), batch.column(1).to_pylist()):
+                    yield seg_id, audio["bytes"]
+
+
+def load_index(shard_dir: Path = SHARD_DIR):
+    with open(index_path(shard_dir), newline="") as f:
+        return {r["segmentid"]: r for r in csv.DictReader(f)}
+
+
+def read_indexed(entry, shard_dir: Path = SHARD_DIR) -> bytes:
+    """WAV bytes of one index.csv entry without scanning its shard."""
+    path = Path(shard_dir) / entry["shard"]
+    if path.suffix == ".tar":
+        with open(path, "rb") as f:
+            f.seek(int(entry["position"]))
+            return f.read(int(entry["size"]))
+
+    # Only the row group holding the row is read; sizes come from the footer
+    import pyarrow.parquet as pq
+    shard = pq.ParquetFile(path)
+    row = int(entry["position"])
+    for group in range(shard.num_row_groups):
+        n = shard.metadata.row_group(group).num_rows
+        if row < n:
+            return shard.read_row_group(group, columns=["audio"]).column(0)[row].as_py()["bytes"]
+        row -= n
+    raise IndexError(f"{entry['segmentid']}: row {entry['position']} is past the end of {path.name}")
+
@@ -0,0 +1,110 @@
+# What main.py downloads and how it stores it. Kept free of import side
+# effects so plan.py can size a batch with the same settings without
+# creating main.py's output directories or loading phase2.
+from pathlib import Path
+
+import yt_dlp
+
+# ---------------- CONFIG ----------------
+DOWNLOAD_WORKERS = 4             # concurrent fetches
+MANIFEST_PATH = Path("download_manifest.json")
+
+# "asr": smallest audio-only stream above the quality floors in formats.py
+# "best": yt_dlp's "bestaudio/best"
+FORMAT_SELECTION = "asr"
+
+# "two_stage": write Phase 1 WAVs to OUTPUT_DIR and run phase2.py afterwards.
+# "fused": decode the download once through phase2's filter chain and write
+# straight to phase2.OUT_DIR (no audio_small/ copy; skip phase2.py).
+INGEST_MODE = "two_stage"
+
+# Stored artifact in two_stage mode. "wav" is 16 kHz s16 PCM (~115 MB/h);
+# "flac" is the same audio losslessly compressed; "native" keeps the
+# downloaded opus/m4a stream untouched. Later phases decode FLAC/native on
+# demand through audio_io, see bench_audio_io.py for the trade-off.
+STORE_FORMAT = "wav"
+
+# Partial downloads for sampling long videos. SECTIONS maps a video ID to the
+# (start, end) ranges to fetch, in seconds or "HH:MM:SS". Videos without an
+# entry get SAMPLE_MINUTES spread evenly over SAMPLE_PIECES ranges, or the
+# whole video when SAMPLE_MINUTES is None.
+SECTIONS = {}
+SAMPLE_MINUTES = None
+SAMPLE_PIECES = 10
+# ---------------------------------------
+
+YOUTUBE_URLS = [
+    # "https://www.youtube.com/watch?v=wQUkAHs_-1M",
+    # "https://www.youtube.com/watch?v=7aL7tKGvoyE",
+    # "https://www.youtube.com/watch?v=rqgFNBX8KMg",
+    # "https://www.youtube.com/watch?v=6KTz9aR4HnE",
+    # "https://www.youtube.com/watch?v=m5AdVEW31KY",
+    # "https://www.youtube.com/watch?v=hRbRBes4YAY",
+    # "https://www.youtube.com/watch?v=xD4n_RSWjwo",
+    # "https://www.youtube.com/watch?v=2UUeAIjmU7w",
+    # "https://www.youtube.com/watch?v=_E28SKoAyIc",
+    # "https://www.youtube.com/watch?v=pvYRilq_M2w",
+    # "http://youtube.com/watch?v=E6DwHnQubag",
+    # "https://www.youtube.com/watch?v=kyZE2AABkHo",
+    # "https://www.youtube.com/shorts/2s-B7ZW0XJM",
+    # "https://www.youtube.com/watch?v=wQUkAHs_-1M",
+    # "https://www.youtube.com/watch?v=HfnjIJTnxsg",
+    # "https://www.youtube.com/watch?v=H8ly868IocE",
+    # "https://www.youtube.com/watch?v=sM4jakkRz2Q",
+    # "https://www.youtube.com/watch?v=XkU_KxSV9Os",
+    # "https://www.youtube.com/watch?v=BMqTMmkJjmI",
+    # "https://www.youtube.com/watch?v=t5pmKbzR1r4",
+    # "https://www.youtube.com/watch?v=M0UWfpAknWM",
+    # "https://www.youtube.com/watch?v=Q5hCVCPMiQs",
+    # "https://www.youtube.com/watch?v=dGlXDdBaSDc"
+    # "https://www.youtube.com/watch?v=IwWPUL8MHi8",
+    # "https://www.youtube.com/watch?v=I87GGs55pgU",
+    # "https://www.youtube.com/watch?v=kLCUkQ3kHDk",
+    # "https://www.youtube.com/watch?v=fFIfQJb9s-0",
+    # "https://www.youtube.com/watch?v=yzvOJAvQPUk",
+    # "https://www.youtube.com/watch?v=gbC66B8BBuc",
+    # "https://www.youtube.com/watch?v=GAj-fv-NF_Q&",
+    # "https://www.youtube.com/watch?v=cQyigImufIo",
+    # "https://www.youtube.com/watch?v=2aQJ8NZFc1Q", 
+    # "https://www.youtube.com/watch?v=fYUMmsfK-Ok",
+    # "https://www.youtube.com/watch?v=faFx_3qoaVM",
+    # "https://www.youtube.com/watch?v=oXbalSJZyVs"
+    # "https://www.youtube.com/watch?v=1C-oG5_3w2w",
+    # "https://www.youtube.com/watch?v=odhSsbd1ee4",
+    # "https://www.youtube.com/watch?v=uzd5j-8w8hw",
+    # "https://www.youtube.com/watch?v=QJd1sYMTMHE"
+
+    "https://www.youtube.com/watch?v=sMY-v0ZlmGA"
+]
+
+
+def _seconds(value) -> float:
+    if isinstance(value, str):
+        return float(yt_dlp.utils.parse_duration(value))
+    return float(value)
+
+
+def even_sample(duration: float, sample_sec: float, pieces: int):
+    """pieces equal ranges totalling sample_sec, centred in equal strata of the video."""
+    if sample_sec >= duration:
+        return []
+    stratum = duration / pieces
+    piece = sample_sec / pieces
+    offset = (stratum - piece) / 2
+    return [(i * stratum + offset, i * stratum + offset + piece) for i in range(pieces)]
+
+
+def requested_sections(info, ydl):
+    # yt_dlp download_ranges callback. yt_dlp downloads nothing at all when it
+    # yields nothing, so the whole video is requested as one empty range {}
+    if info.get("id") in SECTIONS:
+        ranges = [(_seconds(s), _seconds(e)) for s, e in SECTIONS[info["id"]]]
+    elif SAMPLE_MINUTES and info.get("duration"):
+        ranges = even_sample(float(info["duration"]), SAMPLE_MINUTES * 60, SAMPLE_PIECES)
+    else:
+        ranges = []
+
+    if not ranges:
+        yield {}
+    for start, end in ranges:
+        yield {"start_time": start, "end_time": end}
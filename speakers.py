@@ -0,0 +1,264 @@
+# Corpus-wide speaker IDs from the per-speaker embeddings phase4 saves.
+# Each local speaker (segmentspeakerid, or sourcespeakerid in source mode)
+# joins the closest global speaker centroid when cosine similarity clears
+# THRESHOLD, else starts a new one. Assignments and centroids are kept, so
+# incremental runs only place new local speakers and never renumber old ones.
+# A local speaker whose embedding changed (phase4 redid its job) is taken out
+# of its old centroid and placed again.
+import csv
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+# ---------------- CONFIG ----------------
+EMBED_DIR = Path("speaker_embeddings")
+REGISTRY = Path("speaker_registry.npz")     # global centroids (running sums + counts)
+ASSIGNMENTS = Path("speaker_ids.csv")       # local speaker -> global speaker + embedding hash
+SPEAKER_CSV = "speaker_segments.csv"
+OUT_CSV = "speaker_segments_global.csv"
+
+THRESHOLD = 0.65     # cosine similarity to join an existing speaker
+BATCH = 4096         # local speakers scored per matrix product
+
+# Past ANN_MIN global speakers, candidates come from a random-hyperplane LSH
+# index (LSH_TABLES tables of LSH_BITS bits) instead of scoring all of them
+ANN_MIN = 20000
+LSH_BITS = 12
+LSH_TABLES = 8
+LSH_SEED = 0
+# --------------------------------------
+
+
+def unit(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def embedding_hash(vec: np.ndarray) -> str:
+    return hashlib.sha1(np.asarray(vec, dtype=np.float32).tobytes()).hexdigest()[:16]
+
+
+def load_embeddings(embed_dir: Path = EMBED_DIR):
+    """{local speaker ID: embedding}; a redone job's newer file wins."""
+    embeddings = {}
+    for path in sorted(Path(embed_dir).glob("*.npz"), key=lambda p: p.stat().st_mtime):
+        with np.load(path) as data:
+            embeddings.update(zip(data["keys"].tolist(), data["vectors"].astype(np.float32)))
+    return embeddings
+
+
+class LSHIndex:
+    """Random-hyperplane buckets over centroid directions; query returns candidate rows."""
+
+    def __init__(self, dim: int):
+        rng = np.random.default_rng(LSH_SEED)
+        self.planes = rng.standard_normal((LSH_TABLES, LSH_BITS, dim)).astype(np.float32)
+        self.weights = 1 << np.arange(LSH_BITS)
+        self.buckets = [{} for _ in range(LSH_TABLES)]
+        self.codes = {}
+
+    def hash(self, x: np.ndarray) -> np.ndarray:
+        # (n, dim) -> (n, tables) bucket codes
+        return (np.einsum("tbd,nd->ntb", self.planes, x) > 0) @ self.weights
+
+    def put(self, rows, vectors):
+        for row, codes in zip(rows, self.hash(vectors)):
+            old = self.codes.get(row)
+            for t, code in enumerate(codes):
+                if old is not None:
+                    self.buckets[t][old[t]].discard(row)
+                self.buckets[t].setdefault(code, set()).add(row)
+            self.codes[row] = codes
+
+    def candidates(self, x: np.ndarray):
+        """Candidate rows per query vector."""
+        out = []
+        for codes in self.hash(x):
+            found = set()
+            for t, code in enumerate(codes):
+                found |= self.buckets[t].get(code, set())
+            out.append(np.fromiter(found, dtype=np.int64, count=len(found)))
+        return out
+
+
+class Registry:
+    def __init__(self, dim: int, ids=(), sums=None, counts=None, members=None):
+        self.ids = list(ids)
+        self.sums = np.zeros((0, dim), np.float64) if sums is None else sums.astype(np.float64)
+        self.counts = np.zeros(0, np.int64) if counts is None else counts.astype(np.int64)
+        self.centroids = unit(self.sums).astype(np.float32)
+        # local speaker -> (centroid row, the unit vector added to its sum)
+        self.members = members or {}
+        self.lsh = None
+
+    @classmethod
+    def load(cls, dim: int, path: Path = REGISTRY):
+        if not path.exists():
+            return cls(dim)
+        with np.load(path) as data:
+            members = {}
+            if "member_keys" in data.files:  # registries saved before members were kept have none
+                members = dict(zip(
+                    data["member_keys"].tolist(),
+                    zip(data["member_rows"].tolist(), data["member_vectors"]),
+                ))
+            return cls(dim, data["ids"].tolist(), data["sums"], data["counts"], members)
+
+    def save(self, path: Path = REGISTRY):
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        keys = list(self.members)
+        np.savez(
+            tmp,
+            ids=np.array(self.ids),
+            sums=self.sums,
+            counts=self.counts,
+            member_keys=np.array(keys, dtype=str),
+            member_rows=np.array([self.members[k][0] for k in keys], dtype=np.int64),
+            member_vectors=np.array([self.members[k][1] for k in keys], dtype=np.float32).reshape(len(keys), -1),
+        )
+        tmp.replace(path)
+
+    def remove(self, keys):
+        """Take local speakers' vectors back out of their centroids."""
+        touched = set()
+        for key in keys:
+            if key not in self.members:
+                continue
+            row, vec = self.members.pop(key)
+            self.sums[row] -= vec
+            self.counts[row] -= 1
+            touched.add(row)
+        if touched:
+            self.refresh(touched)
+
+    def search(self, x: np.ndarray):
+        """(best centroid row, cosine) per unit vector; row -1 when there is nothing to compare."""
+        n = len(x)
+        best, score = np.full(n, -1), np.full(n, -1.0, dtype=np.float32)
+        if not len(self.ids):
+            return best, score
+        if len(self.ids) < ANN_MIN:
+            sims = x @ self.centroids.T
+            best = np.argmax(sims, axis=1)
+            return best, sims[np.arange(n), best]
+
+        if self.lsh is None:
+            self.lsh = LSHIndex(x.shape[1])
+            self.lsh.put(range(len(self.ids)), self.centroids)
+        for i, rows in enumerate(self.lsh.candidates(x)):
+            if len(rows):
+                sims = self.centroids[rows] @ x[i]
+                j = int(np.argmax(sims))
+                best[i], score[i] = rows[j], sims[j]
+        return best, score
+
+    def add(self, x: np.ndarray) -> int:
+        row = len(self.ids)
+        self.ids.append(f"spk{row:06d}")
+        self.sums = np.vstack([self.sums, np.zeros((1, len(x)))])
+        self.counts = np.append(self.counts, 0)
+        self.centroids = np.vstack([self.centroids, x[None]])
+        return row
+
+    def refresh(self, rows):
+        rows = sorted(rows)
+        self.centroids[rows] = unit(self.sums[rows]).astype(np.float32)
+        if self.lsh is not None:
+            self.lsh.put(rows, self.centroids[rows])
+
+
+def assign(registry: Registry, x: np.ndarray, keys=None):
+    """Global centroid row for each unit vector, creating speakers as needed.
+
+    With keys, each vector is remembered as that local speaker's member of its centroid.
+    """
+    out = np.empty(len(x), dtype=np.int64)
+    for b in range(0, len(x), BATCH):
+        xb = x[b: b + BATCH]
+        best, score = registry.search(xb)
+        # Speakers created within this batch were not searched above
+        fresh, touched = [], set()
+        for i, v in enumerate(xb):
+            row, sim = best[i], score[i]
+            if fresh:
+                sims = registry.centroids[fresh] @ v
+                j = int(np.argmax(sims))
+                if sims[j] > sim:
+                    row, sim = fresh[j], sims[j]
+            if sim < THRESHOLD:
+                row = registry.add(v)
+                fresh.append(row)
+            registry.sums[row] += v
+            registry.counts[row] += 1
+            touched.add(row)
+            out[b + i] = row
+            if keys is not None:
+                registry.members[keys[b + i]] = (row, v)
+        registry.refresh(touched)
+    return out
+
+
+def load_assignments(path: Path = ASSIGNMENTS):
+    """{local speaker: (global speaker, embedding hash)}."""
+    if not path.exists():
+        return {}
+    with open(path, newline="") as f:
+        return {r["localspeakerid"]: (r["globalspeakerid"], r.get("embeddinghash", "")) for r in csv.DictReader(f)}
+
+
+def save_assignments(assigned, path: Path = ASSIGNMENTS):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["localspeakerid", "globalspeakerid", "embeddinghash"])
+        writer.writeheader()
+        writer.writerows(
+            {"localspeakerid": k, "globalspeakerid": g, "embeddinghash": h} for k, (g, h) in assigned.items()
+        )
+    tmp.replace(path)
+
+
+def main():
+    embeddings = load_embeddings()
+    assert embeddings, f"No embeddings in {EMBED_DIR}/; run phase4.py first"
+
+    assigned = load_assignments()
+    hashes = {k: embedding_hash(v) for k, v in embeddings.items()}
+    changed = [k for k in embeddings if k in assigned and assigned[k][1] != hashes[k]]
+    pending = [k for k in embeddings if k not in assigned] + changed
+    dim = len(next(iter(embeddings.values())))
+    registry = Registry.load(dim)
+    before = len(registry.ids)
+
+    if pending:
+        registry.remove(changed)
+        rows = assign(registry, unit(np.stack([embeddings[k] for k in pending])), pending)
+        new = {k: (registry.ids[r], hashes[k]) for k, r in zip(pending, rows)}
+        registry.save()
+        assigned.update(new)
+        save_assignments(assigned)
+
+    print(
+        f"{len(pending) - len(changed)} new and {len(changed)} changed local speakers placed; "
+        f"{len(registry.ids)} global speakers "
+        f"({len(registry.ids) - before} new, {int((registry.counts == 1).sum())} seen once), "
+        f"{'LSH' if len(registry.ids) >= ANN_MIN else 'exact'} search"
+    )
+
+    # Diarization rows with their global speaker, for speaker-disjoint splits
+    if Path(SPEAKER_CSV).exists():
+        with open(SPEAKER_CSV, newline="") as f:
+            reader = csv.DictReader(f)
+            fields = reader.fieldnames + ["globalspeakerid"]
+            rows = list(reader)
+        for r in rows:
+            local = r.get("sourcespeakerid") or r["segmentspeakerid"]
+            r["globalspeakerid"] = assigned.get(local, ("", ""))[0]
+        with open(OUT_CSV, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} rows with globalspeakerid to {OUT_CSV}")
+
+
+if __name__ == "__main__":
+    main()
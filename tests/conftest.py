@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The pipeline scripts create their working directories relative to the cwd
+# on import, so tests import them from a scratch directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.chdir(tempfile.mkdtemp(prefix="pipeline-tests-"))
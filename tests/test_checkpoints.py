@@ -0,0 +1,73 @@
+import csv
+
+from checkpoints import checkpoint, load_done, open_rows
+
+FIELDS = ["segmentid", "speaker"]
+
+
+def read(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_no_log_means_fresh_start(tmp_path):
+    assert load_done(tmp_path / "out.done") == ({}, None)
+
+
+def test_only_ids_before_last_checkpoint_count(tmp_path):
+    log = tmp_path / "out.done"
+    log.write_text("a\tfa\nb\tfb\n@ 10 4\nc\tfc\n@ 20 8\nd\tfd\ne\tfe\n")
+    assert load_done(log) == ({"a": "fa", "b": "fb", "c": "fc"}, [20, 8])
+
+
+def test_ids_logged_without_fingerprint_never_match(tmp_path):
+    log = tmp_path / "out.done"
+    log.write_text("a\n@ 10\n")
+    assert load_done(log) == ({"a": ""}, [10])
+
+
+def test_resume_truncates_rows_written_after_checkpoint(tmp_path):
+    out_path, log_path = tmp_path / "out.csv", tmp_path / "out.done"
+    out, writer = open_rows(out_path, FIELDS, None)
+    with open(log_path, "w") as log:
+        writer.writerow({"segmentid": "a", "speaker": "1"})
+        checkpoint([out], log, [("a", "fa")])
+        # Crash after writing b's row but before its checkpoint
+        writer.writerow({"segmentid": "b", "speaker": "1"})
+        out.flush()
+    out.close()
+
+    done, sizes = load_done(log_path)
+    assert done == {"a": "fa"}
+    out, writer = open_rows(out_path, FIELDS, sizes[0])
+    writer.writerow({"segmentid": "c", "speaker": "2"})
+    out.close()
+    assert [r["segmentid"] for r in read(out_path)] == ["a", "c"]
+
+
+def test_torn_tail_of_done_log_is_ignored(tmp_path):
+    log = tmp_path / "out.done"
+    log.write_text("a\tfa\n@ 30\nb\tfb\n@ 4")  # last checkpoint line cut mid-write
+    done, sizes = load_done(log)
+    assert done == {"a": "fa"} and sizes == [30]
+
+
+def test_keep_drops_rows_being_redone(tmp_path):
+    out_path = tmp_path / "out.csv"
+    out, writer = open_rows(out_path, FIELDS, None)
+    writer.writerows([{"segmentid": s, "speaker": "1"} for s in "abc"])
+    out.close()
+
+    out, _ = open_rows(out_path, FIELDS, out_path.stat().st_size, keep=lambda r: r["segmentid"] != "b")
+    out.close()
+    assert [r["segmentid"] for r in read(out_path)] == ["a", "c"]
+
+
+def test_checkpoint_clears_pending(tmp_path):
+    out, _ = open_rows(tmp_path / "out.csv", FIELDS, None)
+    pending = [("x", "fx"), ("y", "fy")]
+    with open(tmp_path / "out.done", "w") as log:
+        checkpoint([out], log, pending)
+    out.close()
+    assert pending == []
+    assert load_done(tmp_path / "out.done")[0] == {"x": "fx", "y": "fy"}
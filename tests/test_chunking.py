@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import phase3
+import vad
+
+STEP = vad.WINDOW / phase3.SAMPLE_RATE
+
+
+@pytest.mark.parametrize("max_seg", [25.0, 30.0])
+def test_chunks_stay_within_bounds(monkeypatch, max_seg):
+    monkeypatch.setattr(phase3, "MAX_SEG_SEC", max_seg)
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        s = rng.uniform(0, 50)
+        e = s + rng.uniform(phase3.MIN_SEG_SEC, 400)
+        probs = rng.random(int(e / STEP) + 1).astype(np.float32)
+
+        chunks = phase3.chunk_segments([(s, e)], probs)
+
+        assert chunks[0][0] == s and chunks[-1][1] == e
+        assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+        for cs, ce in chunks:
+            assert ce - cs <= max_seg + 1e-9
+            assert ce - cs >= phase3.MIN_SEG_SEC - 1e-9
+
+
+def test_short_runs_drop_and_fitting_runs_stay_whole():
+    assert phase3.chunk_segments([(0.0, phase3.MIN_SEG_SEC - 0.1)]) == []
+    assert phase3.chunk_segments([(3.0, 3.0 + phase3.MAX_SEG_SEC)]) == [(3.0, 3.0 + phase3.MAX_SEG_SEC)]
+
+
+def test_cut_moves_to_pause():
+    # 40 s run: the even cut is at 20 s, a pause at 22 s is within reach
+    probs = np.ones(int(40 / STEP) + 1, dtype=np.float32)
+    probs[int(22 / STEP)] = 0.0
+    (a, cut), (cut2, b) = phase3.chunk_segments([(0.0, 40.0)], probs)
+    assert cut == cut2 and abs(cut - 22.0) < STEP
+
+
+def test_pack_runs_joins_close_runs_up_to_target(monkeypatch):
+    monkeypatch.setattr(phase3, "PACK_TARGET_SEC", 28.0)
+    monkeypatch.setattr(phase3, "PACK_MAX_GAP_SEC", 2.0)
+    runs = [(0.0, 5.0), (6.0, 12.0), (13.0, 27.0), (27.5, 30.0), (40.0, 45.0)]
+    # The third join would pass 28 s; the last run is too far away
+    assert phase3.pack_runs(runs) == [(0.0, 27.0), (27.5, 30.0), (40.0, 45.0)]
+
+
+def speech_track(runs, total_sec: float):
+    probs = np.zeros(int(total_sec / STEP), dtype=np.float32)
+    for s, e in runs:
+        probs[int(s / STEP): int(e / STEP)] = 1.0
+    return probs, int(total_sec * phase3.SAMPLE_RATE)
+
+
+def test_speech_counted_after_packing(monkeypatch):
+    # Two 5 s runs a second apart: dropped unpacked, one 11 s segment packed
+    probs, n_samples = speech_track([(2.0, 7.0), (8.0, 13.0)], 20.0)
+    chunks, speech_sec = phase3.segment_plan(probs, n_samples)
+    assert chunks == [] and abs(speech_sec - 10.0) < 0.2  # plus VAD padding
+
+    monkeypatch.setattr(phase3, "PACK_TARGET_SEC", 28.0)
+    chunks, speech_sec = phase3.segment_plan(probs, n_samples)
+    assert len(chunks) == 1
+    assert abs(speech_sec - (chunks[0][1] - chunks[0][0])) < 1e-9
+
+
+def test_pack_runs_keeps_speakers_apart(monkeypatch):
+    monkeypatch.setattr(phase3, "PACK_TARGET_SEC", 28.0)
+    runs = [(0.0, 5.0), (6.0, 10.0), (11.0, 15.0)]
+    turns = [(0.0, 10.2, "A"), (10.2, 16.0, "B")]
+    assert phase3.pack_runs(runs, turns) == [(0.0, 10.0), (11.0, 15.0)]
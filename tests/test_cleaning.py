@@ -0,0 +1,87 @@
+import numpy as np
+import soundfile as sf
+
+import cleaning
+from audio_io import SAMPLE_RATE
+
+
+def tone(seconds: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.cos(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def test_all_silent_input_trims_to_empty():
+    out = cleaning.clean_array(np.zeros(SAMPLE_RATE, dtype=np.float32))
+    assert out.dtype == np.float32 and len(out) == 0
+
+
+def test_empty_input():
+    assert len(cleaning.clean_array(np.zeros(0, dtype=np.float32))) == 0
+    assert len(cleaning.clean_array(np.zeros(0, dtype=np.float32), gain_db=0.0, trim=False)) == 0
+
+
+def test_silent_input_without_trim_keeps_length():
+    out = cleaning.clean_array(np.zeros(SAMPLE_RATE, dtype=np.float32), gain_db=0.0, trim=False)
+    assert len(out) == SAMPLE_RATE and not out.any()
+
+
+def test_leading_silence_is_trimmed_to_keep_window():
+    audio = np.concatenate([np.zeros(3 * SAMPLE_RATE, dtype=np.float32), tone(2.0)])
+    out = cleaning.clean_array(audio, gain_db=0.0)
+    expected = len(audio) - (3 * SAMPLE_RATE - int(cleaning.SILENCE_KEEP_SEC * SAMPLE_RATE))
+    assert len(out) == expected
+    assert np.abs(out).max() <= 1.0
+
+
+def test_gain_reaches_target_loudness():
+    audio = tone(5.0, amplitude=0.01)
+    gain = cleaning.normalize_gain_db(audio, cleaning.integrated_loudness(audio))
+    louder = audio * np.float32(10 ** (gain / 20))
+    assert abs(cleaning.integrated_loudness(louder) - cleaning.TARGET_LUFS) < 0.5
+
+
+def test_gain_is_capped_by_peak():
+    audio = tone(5.0, amplitude=0.01)
+    audio[100] = 0.9
+    gain = cleaning.normalize_gain_db(audio, cleaning.integrated_loudness(audio))
+    assert 20 * np.log10(0.9) + gain <= cleaning.TRUE_PEAK_DB + 1e-6
+
+
+def test_clean_file_writes_silent_source(tmp_path):
+    src, dst = tmp_path / "in.wav", tmp_path / "out.wav"
+    sf.write(src, np.zeros(SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE, subtype="PCM_16")
+    cleaning.clean_file(src, dst)
+    assert sf.info(str(dst)).frames == 0
+
+
+def noisy_speech(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    bursts = 0.2 * np.sin(2 * np.pi * 180 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+    return (bursts + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def test_blockwise_gate_matches_whole_file(monkeypatch):
+    # 7 s in 1 s blocks, the last one short
+    audio = noisy_speech(7.0)[: 7 * SAMPLE_RATE - 100]
+    noise = cleaning.noise_floor(audio)
+    whole = cleaning.spectral_gate(audio, noise)
+    monkeypatch.setattr(cleaning, "BLOCK_SEC", 1.0)
+    blocks = cleaning.spectral_gate(audio, noise)
+    assert blocks.dtype == np.float32 and len(blocks) == len(audio)
+    assert np.abs(blocks - whole).max() < 1e-5
+
+
+def test_blockwise_filter_carries_state(monkeypatch):
+    from scipy import signal
+
+    audio = noisy_speech(3.0)
+    monkeypatch.setattr(cleaning, "BLOCK_SEC", 0.7)
+    expected = signal.sosfilt(cleaning.band_filters(SAMPLE_RATE).astype(np.float64), audio)
+    assert np.abs(cleaning.blockwise_sosfilt(cleaning.band_filters(SAMPLE_RATE), audio) - expected).max() < 1e-4
+
+
+def test_noise_floor_ignores_short_tail(monkeypatch):
+    monkeypatch.setattr(cleaning, "BLOCK_SEC", 1.0)
+    audio = noisy_speech(2.1)[: 2 * SAMPLE_RATE + 10]
+    assert cleaning.noise_floor(audio).shape == (cleaning.STFT_SIZE // 2 + 1, 1)
@@ -0,0 +1,25 @@
+import formats
+
+OPUS_48 = {"format_id": "249", "acodec": "opus", "vcodec": "none", "abr": 48, "asr": 48000, "filesize": 300}
+OPUS_160 = {"format_id": "251", "acodec": "opus", "vcodec": "none", "abr": 160, "asr": 48000, "filesize": 1000}
+M4A_128 = {"format_id": "140", "acodec": "mp4a.40.2", "vcodec": "none", "abr": 128, "asr": 44100, "filesize": 800}
+MUXED = {"format_id": "18", "acodec": "mp4a.40.2", "vcodec": "avc1", "tbr": 500}
+
+
+def test_selector_picks_smallest_eligible_audio():
+    assert list(formats.asr_format_selector({"formats": [OPUS_160, M4A_128, OPUS_48]})) == [OPUS_48]
+
+
+def test_selector_skips_streams_below_the_floor():
+    low = dict(OPUS_48, format_id="600", abr=24, filesize=100)
+    assert list(formats.asr_format_selector({"formats": [low, M4A_128]})) == [M4A_128]
+
+
+def test_selector_falls_back_to_muxed_then_nothing():
+    assert list(formats.asr_format_selector({"formats": [MUXED]})) == [MUXED]
+    assert list(formats.asr_format_selector({"formats": []})) == []
+
+
+def test_bytes_saved_against_bestaudio():
+    info = {"formats": [OPUS_160, OPUS_48], "format_id": "249", "duration": 60}
+    assert formats.bytes_saved(info) == 700
@@ -0,0 +1,58 @@
+import functools
+import http.server
+import threading
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+pytest.importorskip("yt_dlp")
+import main  # noqa: E402
+
+
+def test_host_limiter_caps_each_host_separately():
+    limiter = main.HostLimiter(2)
+    active, peak = {}, {}
+    lock = threading.Lock()
+
+    def work(url):
+        host = main.host_of(url)
+        with limiter.slot(url):
+            with lock:
+                active[host] = active.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), active[host])
+            time.sleep(0.05)
+            with lock:
+                active[host] -= 1
+
+    urls = [f"https://www.youtube.com/watch?v={i}" for i in range(6)]
+    urls += [f"http://localhost:8000/{i}.wav" for i in range(6)]
+    threads = [threading.Thread(target=work, args=(u,)) for u in urls]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak == {"youtube.com": 2, "localhost:8000": 2}
+
+
+def test_fetch_from_local_http_server(tmp_path, monkeypatch):
+    served = tmp_path / "served"
+    served.mkdir()
+    sf.write(served / "talk.wav", np.zeros(16000, dtype=np.float32), 16000)
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(served))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setitem(main.ydl_opts, "outtmpl", str(tmp_path / "%(id)s.%(ext)s"))
+    monkeypatch.setitem(main.ydl_opts, "quiet", True)
+
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/talk.wav"
+        stats = main.fetch(url, url, main.HostLimiter(1))
+    finally:
+        server.shutdown()
+
+    assert stats["ok"], stats.get("error")
+    assert stats["raw_path"].read_bytes() == (served / "talk.wav").read_bytes()
+    assert stats["bytes"] == stats["raw_path"].stat().st_size
@@ -0,0 +1,36 @@
+from manifest import dedupe_urls, normalize_url
+
+# Duplicates that actually occur in sources.YOUTUBE_URLS
+LISTED = [
+    "https://www.youtube.com/watch?v=wQUkAHs_-1M",
+    "http://youtube.com/watch?v=E6DwHnQubag",
+    "https://www.youtube.com/shorts/2s-B7ZW0XJM",
+    "https://www.youtube.com/watch?v=wQUkAHs_-1M",
+    "https://www.youtube.com/watch?v=GAj-fv-NF_Q&",
+]
+
+
+def test_repeated_video_is_fetched_once():
+    keys = [key for key, _ in dedupe_urls(LISTED)]
+    assert keys == ["wQUkAHs_-1M", "E6DwHnQubag", "2s-B7ZW0XJM", "GAj-fv-NF_Q"]
+
+
+def test_url_variants_share_one_key():
+    variants = [
+        "https://www.youtube.com/watch?v=E6DwHnQubag",
+        "http://youtube.com/watch?v=E6DwHnQubag",
+        "https://m.youtube.com/watch?v=E6DwHnQubag&t=30s",
+        "https://youtu.be/E6DwHnQubag",
+    ]
+    assert dedupe_urls(variants) == [("E6DwHnQubag", "https://www.youtube.com/watch?v=E6DwHnQubag")]
+
+
+def test_shorts_and_trailing_separator_normalize():
+    assert normalize_url("https://www.youtube.com/shorts/2s-B7ZW0XJM") == (
+        "2s-B7ZW0XJM", "https://www.youtube.com/watch?v=2s-B7ZW0XJM")
+    assert normalize_url("https://www.youtube.com/watch?v=GAj-fv-NF_Q&")[0] == "GAj-fv-NF_Q"
+
+
+def test_other_hosts_keyed_by_cleaned_url():
+    key, url = normalize_url("http://LOCALHOST:8000/talk.wav#t=3")
+    assert key == url == "http://localhost:8000/talk.wav"
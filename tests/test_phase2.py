@@ -0,0 +1,64 @@
+import numpy as np
+import soundfile as sf
+
+import cleaning
+import phase2
+from audio_io import SAMPLE_RATE
+from scheduling import split_ranges
+
+
+def test_numpy_chunks_stitch_to_source_length(tmp_path, monkeypatch):
+    monkeypatch.setattr(phase2, "ENGINE", "numpy")
+    monkeypatch.setattr(phase2, "OUT_DIR", tmp_path)
+    monkeypatch.setattr(phase2, "PARTS_DIR", tmp_path / ".parts")
+    phase2.PARTS_DIR.mkdir()
+    src = tmp_path / "in" / "long.wav"
+    src.parent.mkdir()
+    t = np.arange(int(61.37 * SAMPLE_RATE)) / SAMPLE_RATE
+    sf.write(src, (0.3 * np.cos(2 * np.pi * 300 * t)).astype(np.float32), SAMPLE_RATE, subtype="PCM_16")
+
+    ranges = split_ranges(61.37, 13.3, phase2.OVERLAP_SEC, phase2.SPLIT_GRID_SEC)
+    for i, (s, e, _, _) in enumerate(ranges):
+        phase2.clean_chunk(src, i, s, e, 0.0)
+        assert sf.info(str(phase2.part_path(src, i))).frames == round(e * SAMPLE_RATE) - round(s * SAMPLE_RATE)
+    phase2.stitch(src, len(ranges))
+
+    assert sf.info(str(tmp_path / "long.wav")).frames == len(t)
+
+
+def varying_speech(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    level = 0.02 + 0.2 * (np.sin(2 * np.pi * t / 17) > 0)  # loud and quiet stretches for the gates
+    return (level * np.sin(2 * np.pi * 220 * t) + 0.003 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def test_chunk_measurements_combine_to_whole_file_loudness(tmp_path):
+    src = tmp_path / "long.wav"
+    audio = varying_speech(95.45)
+    sf.write(src, audio, SAMPLE_RATE, subtype="FLOAT")
+
+    ranges = split_ranges(95.45, 20.0, phase2.OVERLAP_SEC, phase2.SPLIT_GRID_SEC)
+    parts = [phase2.measure_chunk(src, s, cs, ce) for s, _, cs, ce in ranges]
+    measured = phase2.combine_measurements(parts)
+
+    assert abs(measured["input_i"] - cleaning.integrated_loudness(audio)) < 0.01
+    assert abs(measured["input_tp"] - 20 * np.log10(np.abs(audio).max())) < 1e-6
+
+
+def test_split_file_is_measured_in_chunks_and_cached(tmp_path, monkeypatch):
+    for name, value in [("ENGINE", "numpy"), ("LOUDNORM_MODE", "linear"), ("SPLIT_MIN_SEC", 30),
+                        ("SPLIT_SEC", 12), ("IN_DIR", tmp_path / "in"), ("OUT_DIR", tmp_path / "out"),
+                        ("PARTS_DIR", tmp_path / "out" / ".parts"), ("LOUDNESS_CACHE", tmp_path / "cache")]:
+        monkeypatch.setattr(phase2, name, value)
+    for d in (phase2.IN_DIR, phase2.OUT_DIR, phase2.LOUDNESS_CACHE):
+        d.mkdir()
+    audio = varying_speech(50.0)
+    sf.write(phase2.IN_DIR / "talk.wav", audio, SAMPLE_RATE, subtype="FLOAT")
+
+    phase2.main()
+
+    assert sf.info(str(phase2.OUT_DIR / "talk.wav")).frames == len(audio)
+    (cached,) = phase2.LOUDNESS_CACHE.glob("*.json")
+    digest, gain = phase2.cached_gain_db(phase2.IN_DIR / "talk.wav")
+    assert cached.stem == digest and gain is not None
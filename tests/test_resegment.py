@@ -0,0 +1,90 @@
+import sys
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import phase3
+import resegment
+import segments
+import vad
+from manifest import file_sha256
+
+SR = phase3.SAMPLE_RATE
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for d in (phase3.OUT_DIR, phase3.PROBS_DIR):
+        d.mkdir()
+    monkeypatch.setattr(sys, "argv", ["resegment.py"])
+    monkeypatch.setattr(phase3, "SEGMENT_IDS", "stable")
+    monkeypatch.setattr(phase3, "SEGMENT_FORMAT", "manifest")
+    return tmp_path
+
+
+def track(speech_sec: float, total_sec: float) -> np.ndarray:
+    probs = np.zeros(int(total_sec * SR) // vad.WINDOW, dtype=np.float32)
+    probs[: int(speech_sec * SR) // vad.WINDOW] = 0.9
+    return probs
+
+
+def test_stale_track_is_removed_and_not_used(workdir):
+    source = workdir / "talk.wav"
+    sf.write(source, np.zeros(60 * SR, dtype=np.float32), SR, subtype="PCM_16")
+    digest = file_sha256(source)
+    # Current track: 12 s of speech. Stale track (before re-cleaning): 50 s.
+    phase3.save_probs(source, digest, track(12, 60), 60 * SR)
+    stale = "f" * 64  # sorts after any real digest, so it would be re-cut last
+    phase3.save_probs(source, stale, track(50, 60), 60 * SR)
+
+    resegment.main()
+
+    assert not (phase3.PROBS_DIR / f"{stale}.npz").exists()
+    rows = segments.manifest_rows(segments.SEGMENT_MANIFEST)
+    assert len(rows) == 1
+    assert rows[0]["segmentid"].startswith(digest[:12])
+    assert int(rows[0]["end_sample"]) <= 13 * SR
+
+
+def test_current_tracks_skips_missing_sources(workdir):
+    source = workdir / "gone.wav"
+    sf.write(source, np.zeros(SR, dtype=np.float32), SR, subtype="PCM_16")
+    phase3.save_probs(source, file_sha256(source), track(0, 1), SR)
+    source.unlink()
+    assert resegment.current_tracks(sorted(phase3.PROBS_DIR.glob("*.npz"))) == []
+
+
+def test_clear_segments_removes_stable_and_ordinal_files(workdir):
+    source = workdir / "talk.wav"
+    other = workdir / "other.wav"
+    names = ["talk_seg000", "abcdef012345_0000000000_0000160000", "abcdef012345_0000160000_0000320000", "keep"]
+    for n in names:
+        (phase3.OUT_DIR / f"{n}.wav").touch()
+    rows = [
+        {"segmentid": names[1], "source": str(source)},
+        {"segmentid": names[2], "source": str(source)},
+        {"segmentid": "keep", "source": str(other)},
+    ]
+
+    phase3.clear_segments(source, rows)
+
+    assert sorted(p.stem for p in phase3.OUT_DIR.glob("*.wav")) == ["keep"]
+
+
+def test_resegment_repacks_shards(workdir, monkeypatch):
+    import shards
+
+    monkeypatch.setattr(phase3, "SEGMENT_FORMAT", "shards")
+    source = workdir / "talk.wav"
+    sf.write(source, np.zeros(60 * SR, dtype=np.float32), SR, subtype="PCM_16")
+    phase3.save_probs(source, file_sha256(source), track(40, 60), 60 * SR)
+
+    resegment.main()
+    first = set(shards.load_index())
+    monkeypatch.setattr(sys, "argv", ["resegment.py", "--max-seg", "12"])
+    resegment.main()
+
+    rows = segments.manifest_rows(segments.SEGMENT_MANIFEST)
+    assert set(shards.load_index()) == {r["segmentid"] for r in rows} != first
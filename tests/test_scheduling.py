@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from scheduling import LongestFirst, split_ranges
+
+
+@pytest.mark.parametrize("duration", [5.0, 600.0, 3601.5, 10000.0])
+def test_split_ranges_cores_tile_the_file(duration):
+    ranges = split_ranges(duration, 600.0, 2.0)
+    assert ranges[0][2] == 0.0 and ranges[-1][3] == duration
+    assert all(a[3] == b[2] for a, b in zip(ranges, ranges[1:]))
+    for start, end, core_start, core_end in ranges:
+        assert max(0.0, core_start - 2.0) == start and min(duration, core_end + 2.0) == end
+
+
+def test_longest_first_starts_costliest_job_first():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        sched = LongestFirst(executor, 1)
+        for cost in [3, 10, 1, 7]:
+            sched.push(cost, cost, lambda c: c * 2, cost)
+        assert list(sched.run()) == [(10, 20), (7, 14), (3, 6), (1, 2)]
+
+
+def test_longest_first_runs_jobs_pushed_while_running():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        sched = LongestFirst(executor, 2)
+        sched.push(1, "first", str, 1)
+        seen = []
+        for tag, _ in sched.run():
+            seen.append(tag)
+            if tag == "first":
+                sched.push(5, "follow-up", str, 2)
+        assert seen == ["first", "follow-up"]
+
+
+def test_split_ranges_snap_to_grid():
+    duration = 3 * 3600 + 0.73
+    for start, end, core_start, core_end in split_ranges(duration, 600.0, 2.0, grid=0.1):
+        for t in (start, core_start) + ((end, core_end) if core_end < duration else ()):
+            assert abs(t * 16000 - round(t * 16000)) < 1e-6 and abs(t * 10 - round(t * 10)) < 1e-6
+    assert split_ranges(duration, 600.0, 2.0, grid=0.1)[-1][3] == duration
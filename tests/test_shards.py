@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+import shards
+from segments import Segment
+
+SR = 16000
+
+
+@pytest.fixture
+def segs(tmp_path):
+    source = tmp_path / "talk.wav"
+    rng = np.random.default_rng(0)
+    sf.write(source, (0.1 * rng.standard_normal(20 * SR)).astype(np.float32), SR, subtype="PCM_16")
+    return [Segment(f"seg{i:02d}", source, i * SR, (i + 1) * SR) for i in range(20)]
+
+
+@pytest.mark.parametrize("fmt", ["tar", "parquet"])
+def test_indexed_reads_match_sequential_reads(tmp_path, segs, monkeypatch, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    monkeypatch.setattr(shards, "ROW_GROUP", 3)
+    shard_dir = tmp_path / "shards"
+    # Small shards so segments spread over several files and row groups
+    paths = shards.write_shards(segs, shard_dir, fmt, max_bytes=8 * 2 * SR)
+    assert len(paths) > 1
+
+    sequential = dict(shards.iter_shards(shard_dir))
+    index = shards.load_index(shard_dir)
+    assert list(sequential) == [s.segment_id for s in segs] == list(index)
+    for seg in segs:
+        data = shards.read_indexed(index[seg.segment_id], shard_dir)
+        assert data == sequential[seg.segment_id] == seg.wav_bytes()
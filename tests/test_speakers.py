@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import speakers
+
+DIM = 16
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    speakers.EMBED_DIR.mkdir()
+    return tmp_path
+
+
+def voices(n_speakers: int, per_speaker: int, seed: int = 0):
+    # Tight clusters around random directions, well apart in cosine
+    rng = np.random.default_rng(seed)
+    centres = speakers.unit(rng.standard_normal((n_speakers, DIM)))
+    x = np.repeat(centres, per_speaker, axis=0) + 0.05 * rng.standard_normal((n_speakers * per_speaker, DIM))
+    return speakers.unit(x).astype(np.float32), np.repeat(np.arange(n_speakers), per_speaker)
+
+
+def save_job(name: str, keys, vectors):
+    np.savez(speakers.EMBED_DIR / f"{name}.npz", keys=np.array(keys), vectors=np.asarray(vectors, np.float32))
+
+
+def test_assign_recovers_clusters(monkeypatch):
+    monkeypatch.setattr(speakers, "BATCH", 7)  # speakers created inside a batch must be found too
+    x, truth = voices(5, 20)
+    rows = speakers.assign(speakers.Registry(DIM), x)
+    # Same true speaker <-> same global row
+    assert len(set(rows)) == 5
+    assert all(len(set(rows[truth == t])) == 1 for t in range(5))
+
+
+def test_ids_stable_across_runs(workdir):
+    x, truth = voices(3, 4)
+    save_job("a", [f"s{i}" for i in range(6)], x[:6])
+    speakers.main()
+    first = speakers.load_assignments()
+
+    save_job("b", [f"s{i}" for i in range(6, 12)], x[6:])
+    speakers.main()
+    second = speakers.load_assignments()
+
+    assert all(second[k] == v for k, v in first.items())
+    for i in range(6, 12):
+        same = [j for j in range(6) if truth[j] == truth[i]]
+        if same:
+            assert second[f"s{i}"][0] == second[f"s{same[0]}"][0]
+
+
+def test_changed_embedding_is_placed_again(workdir):
+    x, _ = voices(2, 3)
+    keys = ["a", "b", "c", "d", "e", "f"]
+    save_job("job", keys, x)
+    speakers.main()
+    before = speakers.load_assignments()
+    assert before["a"][0] != before["d"][0]
+
+    # A redone job now gives local speaker "a" the other speaker's voice
+    moved = x.copy()
+    moved[0] = x[4]
+    save_job("job", keys, moved)
+    speakers.main()
+    after = speakers.load_assignments()
+
+    assert after["a"][0] == before["d"][0]
+    assert all(after[k] == before[k] for k in keys[1:])
+    registry = speakers.Registry.load(DIM)
+    assert registry.counts.tolist() == [2, 4]
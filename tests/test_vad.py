@@ -0,0 +1,66 @@
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+import phase3
+import vad
+from bench_vad_gate import synth
+
+# The pinned checkpoint from `python phase3.py --fetch-vad`, if this checkout has it
+CHECKPOINT = Path(__file__).resolve().parent.parent / phase3.VAD_REPO_DIR / phase3.VAD_CHECKPOINT
+
+
+@pytest.fixture(scope="module")
+def model():
+    if not CHECKPOINT.exists():
+        pytest.skip(f"{CHECKPOINT} not fetched")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        return torch.jit.load(str(CHECKPOINT))
+
+
+class CountingModel:
+    def __init__(self, model):
+        self.model, self.calls = model, 0
+
+    def reset_states(self):
+        self.model.reset_states()
+
+    def __call__(self, x, sr):
+        self.calls += 1
+        return self.model(x, sr)
+
+
+def clips():
+    rng = np.random.default_rng(0)
+    return [
+        np.concatenate([synth("silence", 1.0, rng), synth("speech", sec, rng), synth("roomtone", 1.5, rng)])
+        for sec in (3.0, 7.3, 0.4, 5.0)
+    ]
+
+
+def test_batched_matches_sequential(model):
+    audios = clips()
+    sequential = [vad.stream_speech_probs(model, [a])[0] for a in audios]
+    counting = CountingModel(model)
+
+    batched = vad.batched_speech_probs(counting, audios)
+
+    for a, seq, got in zip(audios, sequential, batched):
+        assert len(got) == len(seq)
+        assert np.abs(got - seq).max() < 1e-5
+        assert vad.probs_to_timestamps(got, len(a)) == vad.probs_to_timestamps(seq, len(a))
+    # One step per window of the longest file, not a fixed row length
+    assert counting.calls == max(len(p) for p in sequential)
+
+
+def test_split_rows_cover_every_window(model):
+    audio = np.concatenate(clips())
+    probs = vad.batched_speech_probs(model, [audio], stream_windows=100, warmup_windows=16)[0]
+    assert len(probs) == -(-len(audio) // vad.WINDOW)
+    # The first row starts at window 0, so it is exact
+    sequential = vad.stream_speech_probs(model, [audio])[0]
+    assert np.abs(probs[:100] - sequential[:100]).max() < 1e-5
@@ -0,0 +1,41 @@
+import json
+import os
+from pathlib import Path
+
+# Running totals of measured throughput per phase, read by plan.py
+THROUGHPUT_PATH = Path("throughput.json")
+
+
+def load():
+    if THROUGHPUT_PATH.exists():
+        with open(THROUGHPUT_PATH) as f:
+            return json.load(f)
+    return {}
+
+
+def record(phase: str, audio_sec: float, wall_sec: float, nbytes: int = 0):
+    totals = load()
+    entry = totals.setdefault(phase, {"audio_sec": 0.0, "wall_sec": 0.0, "bytes": 0})
+    entry["audio_sec"] += audio_sec
+    entry["wall_sec"] += wall_sec
+    entry["bytes"] += nbytes
+
+    tmp = THROUGHPUT_PATH.with_name(THROUGHPUT_PATH.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(totals, f, indent=2, sort_keys=True)
+    os.replace(tmp, THROUGHPUT_PATH)
+
+
+def realtime_factor(phase: str, default: float) -> float:
+    """Audio seconds processed per wall second, or default if never measured."""
+    entry = load().get(phase)
+    if not entry or entry["wall_sec"] <= 0 or entry["audio_sec"] <= 0:
+        return default
+    return entry["audio_sec"] / entry["wall_sec"]
+
+
+def bytes_per_sec(phase: str, default: float) -> float:
+    entry = load().get(phase)
+    if not entry or entry["wall_sec"] <= 0 or entry["bytes"] <= 0:
+        return default
+    return entry["bytes"] / entry["wall_sec"]
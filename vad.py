@@ -0,0 +1,217 @@
+# Batched silero VAD. The model is recurrent over 512-sample windows, but it
+# accepts a (batch, 512) input and keeps separate state per batch row, so
+# many files can share each forward pass. A row that starts at the beginning
+# of its file gives exactly the sequential probabilities.
+import math
+
+import numpy as np
+import torch
+
+SAMPLE_RATE = 16000
+WINDOW = 512                 # silero v5 window at 16 kHz
+
+# ---------------- CONFIG ----------------
+# None: one row per file, identical to sequential inference. A number also
+# splits files longer than that many windows into rows at offsets, each
+# replaying WARMUP_WINDOWS of preceding audio first. The recurrent state does
+# not fully converge in that time, so those rows only approximate the
+# sequential probabilities (differences of 0.5 after 512 warm-up windows
+# have been seen on synthetic speech), and speech boundaries near row starts
+# can move.
+STREAM_WINDOWS = None
+WARMUP_WINDOWS = 128         # ~4 s of context replayed before a split row
+MAX_BATCH = 256
+
+# Energy pre-gate: windows quieter than GATE_FLOOR_DB, or GATE_REL_DB under the
+# file's loud windows, or as noise-like as GATE_MAX_ZCR, are skipped when they
+# form a run of at least GATE_MIN_SKIP_SEC; GATE_PAD_SEC either side of
+# anything kept still goes through the model so its state warms up
+GATE_FLOOR_DB = -50.0
+GATE_REL_DB = 35.0
+GATE_MAX_ZCR = 0.45
+GATE_MIN_SKIP_SEC = 1.0
+GATE_PAD_SEC = 0.3
+# --------------------------------------
+
+
+def batched_speech_probs(model, audios, stream_windows=STREAM_WINDOWS, warmup_windows=WARMUP_WINDOWS):
+    """Per-window speech probabilities (float32 arrays) for each mono 16 kHz array."""
+    n_windows = [math.ceil(len(a) / WINDOW) for a in audios]
+    probs = [np.zeros(n, dtype=np.float32) for n in n_windows]
+
+    # (audio index, first window replayed, first window kept, windows kept)
+    pieces = []
+    for i, n in enumerate(n_windows):
+        for w0 in range(0, n, stream_windows or max(n, 1)):
+            warm = min(warmup_windows, w0)
+            pieces.append((i, w0 - warm, w0, min(stream_windows or n, n - w0)))
+    # Rows of similar length share a batch, so few steps run on padding
+    pieces.sort(key=lambda p: p[2] - p[1] + p[3], reverse=True)
+
+    # One flat buffer of window-padded audio so each step is a single gather
+    longest = max((keep - first + count for _, first, keep, count in pieces), default=0)
+    offsets = np.cumsum([0] + [n * WINDOW for n in n_windows])
+    flat = np.zeros(offsets[-1] + longest * WINDOW, dtype=np.float32)
+    for a, off in zip(audios, offsets):
+        flat[off: off + len(a)] = a
+
+    lane = np.arange(WINDOW)
+    with torch.no_grad():
+        for b in range(0, len(pieces), MAX_BATCH):
+            batch = pieces[b: b + MAX_BATCH]
+            steps = max(keep - first + count for _, first, keep, count in batch)
+            starts = np.array([offsets[i] + first * WINDOW for i, first, _, _ in batch])
+            out = np.empty((len(batch), steps), dtype=np.float32)
+            model.reset_states()
+
+            for t in range(steps):
+                x = flat[(starts + t * WINDOW)[:, None] + lane]
+                out[:, t] = model(torch.from_numpy(x), SAMPLE_RATE).numpy().reshape(-1)
+
+            for k, (i, first, keep, count) in enumerate(batch):
+                probs[i][keep: keep + count] = out[k, keep - first: keep - first + count]
+
+    return probs
+
+
+def probs_to_timestamps(
+    probs,
+    n_samples: int,
+    threshold: float = 0.5,
+    min_speech_duration_ms: int = 250,
+    min_silence_duration_ms: int = 100,
+    speech_pad_ms: int = 30,
+):
+    """Port of silero's get_speech_timestamps post-processing (no max_speech_duration_s).
+
+    Returns the same [{"start": sample, "end": sample}, ...] dicts.
+    """
+    min_speech = SAMPLE_RATE * min_speech_duration_ms / 1000
+    min_silence = SAMPLE_RATE * min_silence_duration_ms / 1000
+    pad = SAMPLE_RATE * speech_pad_ms / 1000
+    neg_threshold = max(threshold - 0.15, 0.01)
+
+    speeches = []
+    current = {}
+    triggered = False
+    temp_end = 0
+
+    for i, p in enumerate(probs):
+        pos = WINDOW * i
+        if p >= threshold and temp_end:
+            temp_end = 0
+        if p >= threshold and not triggered:
+            triggered = True
+            current["start"] = pos
+            continue
+        if p < neg_threshold and triggered:
+            if not temp_end:
+                temp_end = pos
+            if pos - temp_end < min_silence:
+                continue
+            current["end"] = temp_end
+            if current["end"] - current["start"] > min_speech:
+                speeches.append(current)
+            current = {}
+            temp_end = 0
+            triggered = False
+
+    if current and n_samples - current["start"] > min_speech:
+        current["end"] = n_samples
+        speeches.append(current)
+
+    for i, speech in enumerate(speeches):
+        if i == 0:
+            speech["start"] = int(max(0, speech["start"] - pad))
+        if i != len(speeches) - 1:
+            gap = speeches[i + 1]["start"] - speech["end"]
+            if gap < 2 * pad:
+                speech["end"] += int(gap // 2)
+                speeches[i + 1]["start"] = int(max(0, speeches[i + 1]["start"] - gap // 2))
+            else:
+                speech["end"] = int(min(n_samples, speech["end"] + pad))
+                speeches[i + 1]["start"] = int(max(0, speeches[i + 1]["start"] - pad))
+        else:
+            speech["end"] = int(min(n_samples, speech["end"] + pad))
+
+    return speeches
+
+
+def stream_speech_probs(model, blocks):
+    """Per-window probabilities over an iterable of audio blocks, one model state throughout.
+
+    Only a sub-window remainder is carried between blocks, so memory stays at
+    one block regardless of file length.
+    """
+    probs = []
+    carry = np.zeros(0, dtype=np.float32)
+    n_samples = 0
+
+    model.reset_states()
+    with torch.no_grad():
+        for block in blocks:
+            n_samples += len(block)
+            buf = np.concatenate([carry, block]) if len(carry) else block
+            n_full = len(buf) // WINDOW
+            for w in range(n_full):
+                x = torch.from_numpy(np.ascontiguousarray(buf[w * WINDOW: (w + 1) * WINDOW]))
+                probs.append(model(x, SAMPLE_RATE).item())
+            carry = buf[n_full * WINDOW:].copy()
+
+        if len(carry):
+            x = np.zeros(WINDOW, dtype=np.float32)
+            x[: len(carry)] = carry
+            probs.append(model(torch.from_numpy(x), SAMPLE_RATE).item())
+
+    return np.asarray(probs, dtype=np.float32), n_samples
+
+
+def _runs(mask):
+    """(start, end) index pairs of the True runs in a boolean array."""
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def energy_gate(audio: np.ndarray) -> np.ndarray:
+    """Per-window mask of where the neural VAD still has to run (True) for one array."""
+    n = math.ceil(len(audio) / WINDOW)
+    frames = np.zeros(n * WINDOW, dtype=np.float32)
+    frames[: len(audio)] = audio
+    frames = frames.reshape(n, WINDOW)
+
+    rms_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+    loud = np.percentile(rms_db, 95) if n else 0.0
+    keep = (rms_db > max(GATE_FLOOR_DB, loud - GATE_REL_DB)) & (zcr < GATE_MAX_ZCR)
+
+    pad = int(GATE_PAD_SEC * SAMPLE_RATE / WINDOW)
+    # Widen kept runs by pad windows each way (max filter via a running count)
+    count = np.concatenate([[0], np.cumsum(keep)])
+    idx = np.arange(n)
+    keep = count[np.minimum(idx + pad + 1, n)] > count[np.maximum(idx - pad, 0)]
+    min_skip = int(GATE_MIN_SKIP_SEC * SAMPLE_RATE / WINDOW)
+    for s, e in _runs(~keep):
+        if e - s < min_skip:
+            keep[s:e] = True
+    return keep
+
+
+def gated_speech_probs(audios, run):
+    """Like run(audios) (a list-of-arrays -> per-window probs function), but only on gated spans.
+
+    Skipped windows get probability 0. Returns (probs, windows, windows skipped).
+    """
+    spans = [[(s, e) for s, e in _runs(energy_gate(a))] for a in audios]
+    pieces = [a[s * WINDOW: e * WINDOW] for a, file_spans in zip(audios, spans) for s, e in file_spans]
+    piece_probs = iter(run(pieces)) if pieces else iter(())
+
+    probs = []
+    for a, file_spans in zip(audios, spans):
+        p = np.zeros(math.ceil(len(a) / WINDOW), dtype=np.float32)
+        for s, e in file_spans:
+            p[s:e] = next(piece_probs)[: e - s]
+        probs.append(p)
+
+    windows = sum(len(p) for p in probs)
+    kept = sum(e - s for file_spans in spans for s, e in file_spans)
+    return probs, windows, windows - kept